@@ -0,0 +1,5 @@
+# The app is a single module at the repository root
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
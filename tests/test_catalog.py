@@ -0,0 +1,75 @@
+# Tests for the item catalog the graph selector is drawn from, kept current one change at a time
+import pytest
+
+import track_and_graph as tg
+
+DATES = ['2024-01-01', '2024-01-02', '2024-01-03']
+
+
+@pytest.fixture
+def core(tmp_path):
+    # A core with its catalog built, recording the catalog ids reported for each change
+    core = tg.TrackerCore(str(tmp_path / 'data.json'), save_delay=0.01)
+    core.build_catalog()
+    core.reported = []
+    core.on_change = lambda change, catalog_ids, changed_ids: core.reported.append(catalog_ids)
+    yield core
+    core.close()
+
+
+def entry_of(core, node_id):
+    entry = core.catalog_entry(node_id)
+    return entry and (entry.path, entry.item_type, entry.first_date, entry.last_date, entry.count)
+
+
+def test_new_items_and_new_dates_are_reported(core):
+    steps = core.add_item(DATES[0], '', 'Steps', 'int')['item']['id']
+    assert core.reported[-1] == {steps}
+    assert entry_of(core, steps) == ('Steps', 'int', DATES[0], DATES[0], 1)
+
+    core.copy_day(DATES[1], DATES[0], False)
+    assert core.reported[-1] == {steps}
+    assert entry_of(core, steps) == ('Steps', 'int', DATES[0], DATES[1], 2)
+
+
+def test_values_and_unrelated_items_leave_entries_alone(core):
+    steps = core.add_item(DATES[0], '', 'Steps', 'int')['item']['id']
+    core.set_value(DATES[0], 'Steps', 10)
+    assert core.reported[-1] == set()
+    hours = core.add_item(DATES[0], '', 'Hours', 'float')['item']['id']
+    assert core.reported[-1] == {hours}
+    assert entry_of(core, steps) == ('Steps', 'int', DATES[0], DATES[0], 1)
+
+
+def test_path_follows_the_latest_date(core):
+    steps = core.add_item(DATES[0], '', 'Steps', 'int')['item']['id']
+    core.add_folder(DATES[0], '', 'Health')
+    core.copy_day(DATES[1], DATES[0], True)
+    # A move on an earlier date doesn't change where the item is listed
+    core.move(DATES[0], 'Steps', 'Health', 0)
+    assert core.reported[-1] == set()
+    assert entry_of(core, steps)[0] == 'Steps'
+    core.move(DATES[1], 'Steps', 'Health', 0)
+    assert core.reported[-1] == {steps}
+    assert entry_of(core, steps)[0] == 'Health/Steps'
+    assert core.catalog_tree() == {'folders': {'Health': {'folders': {}, 'items': [('Steps', steps)]}}, 'items': []}
+
+
+def test_replaced_days_remove_occurrences(core):
+    steps = core.add_item(DATES[0], '', 'Steps', 'int')['item']['id']
+    core.copy_day(DATES[1], DATES[0], True)
+    core.add_item(DATES[2], '', 'Hours', 'float')
+    core.add_folder(DATES[1], '', 'Health')
+    core.move(DATES[1], 'Steps', 'Health', 0)
+    assert entry_of(core, steps) == ('Health/Steps', 'int', DATES[0], DATES[1], 2)
+
+    # Its last date no longer has it: the range and path come from the dates that still do
+    core.copy_day(DATES[1], DATES[2], False)
+    assert steps in core.reported[-1]
+    assert entry_of(core, steps) == ('Steps', 'int', DATES[0], DATES[0], 1)
+
+    # Its only date no longer has it: it is no longer catalogued
+    core.copy_day(DATES[0], DATES[2], False)
+    assert steps in core.reported[-1]
+    assert entry_of(core, steps) is None
+    assert [name for name, node_id in tg.iter_catalog_items(core.catalog_tree())] == ['Hours']
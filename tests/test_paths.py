@@ -0,0 +1,98 @@
+# Tests for the per-day path index, kept in step with the day's dict as nodes are added and moved
+import random
+
+import pytest
+
+import track_and_graph as tg
+
+
+def item(name, node_id):
+    return {'name': name, 'type': 'int', 'value': 0, 'id': node_id}
+
+
+def folder(name, node_id, folders=(), items=()):
+    return {'name': name, 'id': node_id, 'folders': list(folders), 'items': list(items)}
+
+
+def assert_matches_fresh_index(index, day_data):
+    fresh = tg.PathIndex(day_data)
+    assert {path: id(node) for path, node in index.nodes.items()} == {path: id(node) for path, node in fresh.nodes.items()}
+    assert {node_id: id(node) for node_id, node in index.ids.items()} == {node_id: id(node) for node_id, node in fresh.ids.items()}
+
+
+def test_new_folder_shadows_an_item_of_the_same_name():
+    day_data = {'folders': [], 'items': [item('x', 1)]}
+    index = tg.PathIndex(day_data)
+    day_data['folders'].append(folder('x', 2))
+    index.add('', day_data['folders'][0])
+    assert index.get('x') is day_data['folders'][0]
+    assert index.get_by_id(1) is None
+    assert_matches_fresh_index(index, day_data)
+
+
+def test_duplicates_resolve_like_resolve_node():
+    # A folder shadows an item of the same name, and the first of two items wins
+    day_data = {'folders': [folder('x', 1)], 'items': [item('x', 2), item('y', 3), item('y', 4)]}
+    index = tg.PathIndex(day_data)
+    assert index.get('x') is tg.resolve_node(day_data, 'x') is day_data['folders'][0]
+    assert index.get('y') is tg.resolve_node(day_data, 'y') is day_data['items'][1]
+    # Dropping a shadowed node leaves the path to the node that owns it
+    index.drop('y', day_data['items'][2])
+    assert index.get('y') is day_data['items'][1]
+    assert index.get_by_id(4) is None
+
+
+def test_moving_a_folder_rekeys_everything_under_it():
+    day_data = {'folders': [folder('F', 1, folders=[folder('G', 2, items=[item('x', 3)])]), folder('H', 4)],
+                'items': []}
+    index = tg.PathIndex(day_data)
+    moved = day_data['folders'][0]['folders'].pop()
+    day_data['folders'][1]['folders'].append(moved)
+    index.move('F/G', 'H', moved)
+    assert index.get('H/G/x') is moved['items'][0]
+    assert index.get('F/G') is None and index.get('F/G/x') is None
+    assert index.get_by_id(3) is moved['items'][0]
+    assert_matches_fresh_index(index, day_data)
+
+
+def test_moving_a_node_off_a_duplicate_leaves_the_path_to_the_first():
+    day_data = {'folders': [folder('F', 1)], 'items': [item('x', 2), item('x', 3)]}
+    index = tg.PathIndex(day_data)
+    moved = day_data['items'].pop()
+    day_data['folders'][0]['items'].append(moved)
+    index.move('x', 'F', moved)
+    assert index.get('x') is day_data['items'][0]
+    assert index.get('F/x') is moved and index.get_by_id(3) is moved
+    assert_matches_fresh_index(index, day_data)
+
+
+def test_folder_path_is_the_deepest_folder():
+    day_data = {'folders': [folder('F', 1, folders=[folder('G', 2)], items=[item('x', 3)])], 'items': []}
+    index = tg.PathIndex(day_data)
+    assert index.folder_path('F/G') == 'F/G'
+    assert index.folder_path('F/x') == 'F'
+    assert index.folder_path('F/missing/deeper') == 'F'
+    assert index.folder_path('x') == ''
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_core_keeps_day_indexes_in_step_with_edits(tmp_path, seed):
+    rng = random.Random(seed)
+    random.seed(seed)
+    core = tg.TrackerCore(str(tmp_path / 'data.json'), save_delay=0.01)
+    date = '2024-01-01'
+    names = ['a', 'b', 'c']
+    core.add_folder(date, '', 'a')
+    for step in range(60):
+        paths = list(core.day_index(date).nodes)
+        folders = [path for path in paths if 'type' not in core.get(date, path)]
+        op = rng.random()
+        if op < 0.3:
+            core.add_folder(date, rng.choice(folders), rng.choice(names))
+        elif op < 0.55:
+            core.add_item(date, rng.choice(folders), rng.choice(names), 'int')
+        else:
+            core.move(date, rng.choice(paths[1:] or ['']), rng.choice(folders), rng.randint(0, 3))
+        with core.lock:
+            assert_matches_fresh_index(core.day_index(date), core.day(date))
+    core.close()
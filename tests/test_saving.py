@@ -0,0 +1,80 @@
+# Tests for the save worker's coalescing of queued change records
+import copy
+import random
+
+import pytest
+
+import track_and_graph as tg
+
+DATES = ['2024-01-01', '2024-01-02', '2024-01-03']
+
+
+def set_value(date, path, value):
+    return {'op': 'set_value', 'date': date, 'path': path, 'value': value}
+
+
+def add_item(date, name, parent=''):
+    return {'op': 'add_item', 'date': date, 'parent': parent,
+            'item': {'name': name, 'type': 'int', 'value': 0, 'id': tg.node_id_for_path(name)}}
+
+
+def copy_day(date, source, values=True):
+    return {'op': 'copy_day', 'date': date, 'source': source, 'values': values}
+
+
+def test_only_the_last_value_of_an_item_is_kept():
+    changes = [set_value(DATES[0], 'a', 1), set_value(DATES[0], 'b', 2), set_value(DATES[0], 'a', 3),
+               set_value(DATES[1], 'a', 4)]
+    assert tg.coalesce_changes(changes) == changes[1:]
+
+
+def test_structural_changes_keep_earlier_values():
+    # After a move the same path can name another item, so both values must be written
+    changes = [set_value(DATES[0], 'a', 1),
+               {'op': 'move', 'date': DATES[0], 'path': 'a', 'parent': 'F', 'index': 0},
+               set_value(DATES[0], 'a', 2)]
+    assert tg.coalesce_changes(changes) == changes
+
+
+def test_replaced_days_drop_their_earlier_records():
+    changes = [add_item(DATES[1], 'a'), set_value(DATES[1], 'a', 1), copy_day(DATES[1], DATES[0]),
+               set_value(DATES[1], 'a', 2)]
+    assert tg.coalesce_changes(changes) == changes[2:]
+
+
+def test_copy_sources_keep_their_earlier_records():
+    changes = [add_item(DATES[0], 'a'), set_value(DATES[0], 'a', 1), set_value(DATES[0], 'a', 2),
+               copy_day(DATES[1], DATES[0]), set_value(DATES[0], 'a', 3)]
+    # The copy reads the value set before it, so that one stays; only the first is redundant
+    assert tg.coalesce_changes(changes) == [changes[0]] + changes[2:]
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_coalesced_batches_apply_to_the_same_days(seed):
+    rng = random.Random(seed)
+    names = ['a', 'b', 'F/a']
+    changes = [add_item(date, name) for date in DATES[:2] for name in names[:2]]
+    recorded = DATES[:2]
+    for step in range(40):
+        # Only days already recorded are edited or copied, as in the app
+        date = rng.choice(recorded)
+        op = rng.random()
+        if op < 0.5:
+            changes.append(set_value(date, rng.choice(names), rng.randint(0, 9)))
+        elif op < 0.65:
+            changes.append(add_item(date, rng.choice(names[:2])))
+        elif op < 0.75:
+            changes.append({'op': 'add_folder', 'date': date, 'parent': '', 'name': 'F', 'id': 1})
+        elif op < 0.9:
+            date = rng.choice(DATES)
+            changes.append(copy_day(date, rng.choice(recorded), rng.random() < 0.5))
+            recorded = sorted(set(recorded) | {date})
+        else:
+            changes.append({'op': 'move', 'date': date, 'path': rng.choice(names), 'parent': rng.choice(['', 'F']),
+                            'index': rng.randint(0, 2)})
+    expected, coalesced = {}, {}
+    for change in changes:
+        tg.apply_change(expected, copy.deepcopy(change))
+    for change in tg.coalesce_changes(changes):
+        tg.apply_change(coalesced, copy.deepcopy(change))
+    assert coalesced == expected
@@ -0,0 +1,123 @@
+# Tests for the graph series: the column each item's points are kept in, and their aggregation
+# and downsampling for drawing
+import numpy as np
+import pytest
+
+import track_and_graph as tg
+
+# Monday 1 January 2024 onwards, with gaps, into February
+DATES = np.array(['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-08', '2024-01-31', '2024-02-01'],
+                 dtype='datetime64[D]')
+VALUES = np.array([1.0, 0.0, 2.0, 3.0, 0.0, 5.0])
+
+
+def day_list(dates):
+    return [str(date) for date in dates]
+
+
+def test_daily_is_unchanged():
+    dates, values = tg.aggregate_series(DATES, VALUES, "Daily")
+    assert dates is DATES and values is VALUES
+
+
+def test_weekly_totals_start_on_monday():
+    dates, values = tg.aggregate_series(DATES, VALUES, "Weekly total")
+    assert day_list(dates) == ['2024-01-01', '2024-01-08', '2024-01-29']
+    assert list(values) == [3.0, 3.0, 5.0]
+
+
+def test_monthly_totals_start_on_the_first():
+    dates, values = tg.aggregate_series(DATES, VALUES, "Monthly total")
+    assert day_list(dates) == ['2024-01-01', '2024-02-01']
+    assert list(values) == [6.0, 5.0]
+
+
+def test_rolling_mean_covers_recorded_days_of_the_last_week():
+    dates, values = tg.aggregate_series(DATES, VALUES, "Rolling mean (7 days)")
+    assert day_list(dates) == day_list(DATES)
+    assert values == pytest.approx([1.0, 0.5, 1.0, 5 / 3, 0.0, 2.5])
+
+
+def test_completion_rate_is_the_share_of_completed_days():
+    dates, values = tg.aggregate_series(DATES, VALUES, "Completion rate (weekly)")
+    assert day_list(dates) == ['2024-01-01', '2024-01-08', '2024-01-29']
+    assert values == pytest.approx([2 / 3, 1.0, 0.5])
+
+
+def test_completion_rate_is_only_offered_for_complete_incomplete_items():
+    assert "Completion rate (weekly)" in tg.aggregations_for(['complete/incomplete'])
+    assert "Completion rate (weekly)" not in tg.aggregations_for(['int'])
+    assert "Completion rate (weekly)" not in tg.aggregations_for(['complete/incomplete', 'float'])
+    assert tg.aggregations_for(['int']) == [mode for mode in tg.AGGREGATIONS if mode != "Completion rate (weekly)"]
+
+
+def test_graph_points_refuse_completion_rate_of_numbers(tmp_path):
+    core = tg.TrackerCore(str(tmp_path / 'data.json'), save_delay=0.01)
+    core.add_item('2024-01-01', '', 'Steps', 'int')
+    core.add_item('2024-01-01', '', 'Walked', 'complete/incomplete')
+    core.set_value('2024-01-01', 'Steps', 4000)
+    core.set_value('2024-01-01', 'Walked', True)
+    steps, walked = (core.day('2024-01-01')['items'][index]['id'] for index in range(2))
+    assert core.graph_points(steps, "Completion rate (weekly)", max_points=100) is None
+    dates, values, bar_days = core.graph_points(walked, "Completion rate (weekly)", max_points=100)
+    assert list(values) == [1.0]
+    core.close()
+
+
+def test_empty_series_aggregate_to_nothing():
+    empty = np.empty(0, dtype='datetime64[D]')
+    for mode in tg.AGGREGATIONS:
+        dates, values = tg.aggregate_series(empty, np.empty(0), mode)
+        assert len(dates) == len(values) == 0
+
+
+def test_downsampling_averages_runs_labelled_by_their_first_date():
+    dates = np.arange('2024-01-01', '2024-01-11', dtype='datetime64[D]')
+    values = np.arange(10, dtype=np.float64)
+    sampled_dates, sampled_values = tg.downsample_series(dates, values, 4)
+    assert day_list(sampled_dates) == ['2024-01-01', '2024-01-03', '2024-01-06', '2024-01-08']
+    assert list(sampled_values) == [0.5, 3.0, 5.5, 8.0]
+    # Short enough already
+    assert tg.downsample_series(dates, values, 10) == (dates, values)
+
+
+def column_points(column):
+    dates, values = column.series()
+    return list(zip(day_list(dates), values.tolist()))
+
+
+def test_series_column_keeps_points_sorted_by_date():
+    column = tg.SeriesColumn('int')
+    assert column.set('2024-01-03', 3)
+    assert column.set('2024-01-01', 1)
+    assert column.set('2024-01-02', 2)
+    assert column_points(column) == [('2024-01-01', 1.0), ('2024-01-02', 2.0), ('2024-01-03', 3.0)]
+
+
+def test_series_column_set_reports_changes_only():
+    column = tg.SeriesColumn('int')
+    column.set('2024-01-01', 1)
+    assert not column.set('2024-01-01', 1)
+    assert column.set('2024-01-01', 4)
+    assert column_points(column) == [('2024-01-01', 4.0)]
+
+
+def test_series_column_grows_past_its_capacity():
+    column = tg.SeriesColumn('float')
+    days = np.arange('2024-01-01', '2024-03-01', dtype='datetime64[D]')
+    for number, day in enumerate(reversed(days)):
+        column.set(str(day), float(number))
+    assert column.size == len(days)
+    assert day_list(column.series()[0]) == day_list(days)
+    assert column.series()[1].tolist() == [float(number) for number in reversed(range(len(days)))]
+
+
+def test_series_column_remove():
+    dates = np.array(['2024-01-01', '2024-01-02', '2024-01-03'], dtype='datetime64[D]')
+    column = tg.SeriesColumn('int', dates, np.array([1.0, 2.0, 3.0]))
+    assert column.remove('2024-01-02')
+    assert not column.remove('2024-01-02')
+    assert not column.remove('2024-02-01')
+    assert column_points(column) == [('2024-01-01', 1.0), ('2024-01-03', 3.0)]
+    assert column.remove('2024-01-03') and column.remove('2024-01-01')
+    assert column_points(column) == []
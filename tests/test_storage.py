@@ -0,0 +1,349 @@
+# Round-trip and differential tests for the storage backends, driving TrackerCore headlessly
+# the way the benchmark does. Run with: python -m pytest -q
+import copy
+import json
+import os
+import random
+
+import pytest
+
+import track_and_graph as tg
+
+EXTENSIONS = ['.json', '.tgb', '.db']
+JOURNALED_EXTENSIONS = ['.json', '.tgb']
+DATES = ['2024-01-01', '2024-01-02', '2024-01-03']
+
+
+def open_core(tmp_path, extension):
+    return tg.TrackerCore(str(tmp_path / ('data' + extension)), save_delay=0.01)
+
+
+def all_days(core):
+    with core.lock:
+        return {date: copy.deepcopy(core.day(date)) for date in core.data}
+
+
+def reopened_days(tmp_path, extension):
+    core = open_core(tmp_path, extension)
+    try:
+        return all_days(core)
+    finally:
+        core.close()
+
+
+def compact(tmp_path, extension):
+    # Folds the journal into the snapshot, as a background compaction does
+    storage = tg.open_storage(str(tmp_path / ('data' + extension)))
+    storage.load()
+    storage.compact_in_background()
+    storage.close()
+
+
+def fill(core):
+    # Two days with nested folders, values of every type and a copy between them
+    core.add_folder(DATES[0], '', 'Health')
+    core.add_folder(DATES[0], 'Health', 'Sleep')
+    core.add_item(DATES[0], 'Health/Sleep', 'Hours', 'float')
+    core.add_item(DATES[0], 'Health', 'Steps', 'int')
+    core.add_item(DATES[0], '', 'Meditated', 'complete/incomplete')
+    core.add_item(DATES[0], '', 'Note', 'string')
+    core.set_value(DATES[0], 'Health/Sleep/Hours', 7.5)
+    core.set_value(DATES[0], 'Health/Steps', 8200)
+    core.set_value(DATES[0], 'Meditated', True)
+    core.set_value(DATES[0], 'Note', 'fine')
+    core.copy_day(DATES[1], DATES[0], False)
+    core.set_value(DATES[1], 'Health/Steps', 10400)
+
+
+def random_edits(core, seed, steps):
+    # Random adds, values, copies and moves over a few dates and clashing names
+    rng = random.Random(seed)
+    random.seed(seed)  # new_node_id falls back to random ids
+    names = ['a', 'b', 'c']
+    for step in range(steps):
+        date = rng.choice(DATES)
+        op = rng.random()
+        paths = list(core.day_index(date).nodes) if core.has_date(date) else ['']
+        folders = [path for path in paths if 'type' not in core.get(date, path)] if core.has_date(date) else ['']
+        if op < 0.25:
+            core.add_folder(date, rng.choice(folders), rng.choice(names))
+        elif op < 0.5:
+            core.add_item(date, rng.choice(folders), rng.choice(names),
+                          rng.choice(['int', 'float', 'complete/incomplete', 'string']))
+        elif not core.has_date(date):
+            continue
+        elif op < 0.65:
+            core.set_value(date, rng.choice(paths), rng.randint(0, 9))
+        elif op < 0.75:
+            core.copy_day(date, rng.choice(DATES), rng.random() < 0.5)
+        else:
+            core.move(date, rng.choice(paths[1:] or ['']), rng.choice(paths), rng.randint(0, 3))
+
+
+@pytest.mark.parametrize('extension', EXTENSIONS)
+def test_changes_survive_reopen(tmp_path, extension):
+    core = open_core(tmp_path, extension)
+    fill(core)
+    expected = all_days(core)
+    core.close()
+    assert reopened_days(tmp_path, extension) == expected
+    assert expected[DATES[1]]['folders'][0]['items'][0]['value'] == 10400
+    assert expected[DATES[1]]['items'][0]['value'] == tg.default_value('complete/incomplete')
+
+
+@pytest.mark.parametrize('indent', [None, 0, 2])
+def test_other_json_layouts_are_converted(tmp_path, indent):
+    # Files written by json.dump, compact or pretty-printed, hold the whole history too
+    days = {date: {'folders': [], 'items': [{'name': 'x', 'type': 'int', 'value': number}]}
+            for number, date in enumerate(DATES)}
+    (tmp_path / 'data.json').write_text(json.dumps(days, indent=indent))
+    core = open_core(tmp_path, '.json')
+    assert sorted(core.data) == DATES
+    core.add_item('2024-01-04', '', 'y', 'int')
+    expected = all_days(core)
+    core.close()
+    compact(tmp_path, '.json')
+    assert reopened_days(tmp_path, '.json') == expected
+    assert [day['items'][0]['value'] for date, day in sorted(expected.items())][:3] == [0, 1, 2]
+
+
+def item_points(core, name):
+    # The Daily points of the catalogued item called name
+    core.build_catalog()
+    for date, day_data in core.read_days(core.missing_dates()):
+        core.add_loaded(date, day_data)
+    node_id, = [node_id for item_name, node_id in tg.iter_catalog_items(core.catalog_tree()) if item_name == name]
+    dates, values, _ = core.graph_points(node_id, 'Daily', max_points=100)
+    return node_id, list(values)
+
+
+def test_legacy_items_keep_their_history_through_moves(tmp_path):
+    # Days saved before ids existed, then a copy and a move that are compacted into the snapshot
+    days = {date: {'folders': [{'name': 'F', 'folders': [], 'items': []}],
+                   'items': [{'name': 'x', 'type': 'int', 'value': number}]}
+            for number, date in enumerate(DATES[:2], 1)}
+    (tmp_path / 'data.json').write_text(json.dumps(days))
+    core = open_core(tmp_path, '.json')
+    core.copy_day(DATES[2], DATES[1], True)
+    core.move(DATES[2], 'x', 'F', 0)
+    expected = item_points(core, 'x')
+    core.close()
+    assert expected[1] == [1, 2, 2]
+    tg.convert_storage(str(tmp_path / 'data.json'), str(tmp_path / 'converted.json'))
+    compact(tmp_path, '.json')
+
+    for name in ('data.json', 'converted.json'):
+        core = tg.TrackerCore(str(tmp_path / name), save_delay=0.01)
+        assert item_points(core, 'x') == expected
+        core.close()
+
+
+@pytest.mark.parametrize('extension', JOURNALED_EXTENSIONS)
+def test_journal_is_replayed_over_snapshot(tmp_path, extension):
+    core = open_core(tmp_path, extension)
+    fill(core)
+    core.close()
+    compact(tmp_path, extension)
+    core = open_core(tmp_path, extension)
+    core.set_value(DATES[1], 'Note', 'later')
+    core.add_item(DATES[2], '', 'Weight', 'float')
+    expected = all_days(core)
+    core.close()
+    assert os.path.getsize(core.storage.journal_path) > 0
+    assert reopened_days(tmp_path, extension) == expected
+
+
+@pytest.mark.parametrize('extension', JOURNALED_EXTENSIONS)
+def test_torn_journal_record_is_truncated(tmp_path, extension):
+    core = open_core(tmp_path, extension)
+    fill(core)
+    expected = all_days(core)
+    core.close()
+    journal_path = core.storage.journal_path
+    good_size = os.path.getsize(journal_path)
+    with open(journal_path, 'ab') as f:
+        f.write(b'{"op": "set_value", "date": "2024-01-01", "pa')
+
+    core = open_core(tmp_path, extension)
+    assert all_days(core) == expected
+    assert os.path.getsize(journal_path) == good_size
+    # New records go after the last intact one
+    core.set_value(DATES[0], 'Health/Steps', 1)
+    expected = all_days(core)
+    core.close()
+    assert reopened_days(tmp_path, extension) == expected
+
+
+@pytest.mark.parametrize('extension', JOURNALED_EXTENSIONS)
+def test_unfinished_compaction_is_redone(tmp_path, extension):
+    core = open_core(tmp_path, extension)
+    fill(core)
+    expected = all_days(core)
+    core.close()
+    # A crash right after the journal was set aside for compaction
+    storage = core.storage
+    os.replace(storage.journal_path, storage.compacting_path)
+
+    assert reopened_days(tmp_path, extension) == expected
+    assert not os.path.exists(storage.compacting_path)
+    assert not os.path.exists(storage.journal_path)
+
+
+@pytest.mark.parametrize('extension', JOURNALED_EXTENSIONS)
+def test_absorbed_segment_is_not_replayed(tmp_path, extension):
+    core = open_core(tmp_path, extension)
+    fill(core)
+    core.close()
+    compact(tmp_path, extension)
+    core = open_core(tmp_path, extension)
+    # copy_day is not idempotent, so replaying this segment twice would lose the new value
+    core.set_value(DATES[0], 'Health/Steps', 500)
+    core.copy_day(DATES[2], DATES[0], True)
+    core.set_value(DATES[0], 'Health/Steps', 600)
+    expected = all_days(core)
+    core.close()
+
+    # A crash after the new snapshot was written but before it replaced the old one
+    storage = tg.open_storage(core.data_file)
+    storage.load()
+    os.replace(storage.journal_path, storage.compacting_path)
+    storage.write_snapshot_lines(storage.compacted_days(storage.segment_days()))
+    os.replace(storage.compacting_path, storage.absorbed_path)
+    storage.close()
+
+    assert reopened_days(tmp_path, extension) == expected
+    for path in (storage.absorbed_path, storage.compacting_path, storage.temp_path):
+        assert not os.path.exists(path)
+
+
+def test_sqlite_move_row_rewrites_paths(tmp_path):
+    core = open_core(tmp_path, '.db')
+    fill(core)
+    # Folder into a sibling folder, then an item to the front of the root
+    assert core.move(DATES[0], 'Health/Sleep', '', 0) is not None
+    assert core.move(DATES[0], 'Note', '', 0) is not None
+    # Refused: a folder into itself, a clash with an existing name, a missing destination
+    assert core.move(DATES[0], 'Sleep', 'Sleep', 0) is None
+    core.add_item(DATES[0], 'Health', 'Hours', 'int')
+    assert core.move(DATES[0], 'Sleep/Hours', 'Health', 0) is None
+    assert core.move(DATES[0], 'Note', 'Missing', 0) is None
+    expected = all_days(core)
+    core.close()
+
+    storage = tg.SqliteStorage(core.data_file)
+    rows = storage.conn.execute("SELECT path, position FROM items WHERE date_id = ? ORDER BY path",
+                                (storage.date_id(DATES[0]),)).fetchall()
+    plan = ' '.join(row[3] for row in storage.conn.execute(
+        "EXPLAIN QUERY PLAN UPDATE items SET path = ? || substr(path, ?) WHERE date_id = ? AND substr(path, 1, ?) = ?",
+        ('Other/', 7, 1, 6, 'Sleep/')))
+    storage.close()
+    assert rows == [('Health/Hours', 1), ('Health/Steps', 0), ('Meditated', 1), ('Note', 0), ('Sleep/Hours', 0)]
+    # A folder move only touches the rows of its own day
+    assert 'SCAN' not in plan
+    assert reopened_days(tmp_path, '.db') == expected
+
+
+def test_sqlite_drops_value_paths_of_older_databases(tmp_path):
+    core = open_core(tmp_path, '.db')
+    fill(core)
+    core.close()
+    # item_values as older versions wrote it, with each value's item path and date
+    storage = tg.SqliteStorage(core.data_file)
+    with storage.conn:
+        storage.conn.execute("ALTER TABLE item_values ADD COLUMN item_path TEXT NOT NULL DEFAULT ''")
+        storage.conn.execute("ALTER TABLE item_values ADD COLUMN date TEXT NOT NULL DEFAULT ''")
+    storage.close()
+
+    core = open_core(tmp_path, '.db')
+    core.move(DATES[0], 'Health/Sleep', '', 0)
+    core.add_item(DATES[2], '', 'Weight', 'float')
+    expected = all_days(core)
+    core.close()
+    storage = tg.SqliteStorage(core.data_file)
+    columns = [row[1] for row in storage.conn.execute("PRAGMA table_info(item_values)")]
+    storage.close()
+    assert columns == ['item_id', 'value']
+    assert reopened_days(tmp_path, '.db') == expected
+
+
+def test_json_binary_round_trip(tmp_path):
+    core = open_core(tmp_path, '.json')
+    fill(core)
+    expected = all_days(core)
+    core.close()
+    tg.convert_storage(str(tmp_path / 'data.json'), str(tmp_path / 'converted.tgb'))
+    tg.convert_storage(str(tmp_path / 'converted.tgb'), str(tmp_path / 'back.json'))
+
+    for name in ('converted.tgb', 'back.json'):
+        core = tg.TrackerCore(str(tmp_path / name), save_delay=0.01)
+        assert all_days(core) == expected
+        core.close()
+
+
+@pytest.mark.parametrize('extension', EXTENSIONS)
+def test_stored_series_match_full_walk(tmp_path, extension):
+    core = open_core(tmp_path, extension)
+    fill(core)
+    core.close()
+    if extension in JOURNALED_EXTENSIONS:
+        compact(tmp_path, extension)
+    core = open_core(tmp_path, extension)
+    core.set_value(DATES[1], 'Health/Sleep/Hours', 6.0)
+    core.close()
+
+    points = []
+    for read_stored in (True, False):
+        core = open_core(tmp_path, extension)
+        if not read_stored:
+            # Without stored series every day is walked instead
+            core.storage.snapshot_series = lambda node_ids: None
+        core.build_catalog()
+        for date, day_data in core.read_days(core.missing_dates()):
+            core.add_loaded(date, day_data)
+        node_ids = sorted(node_id for _, node_id in tg.iter_catalog_items(core.catalog_tree()))
+        points.append({node_id: [list(array) for array in core.graph_points(node_id, 'Daily', max_points=100)[:2]]
+                       for node_id in node_ids})
+        core.close()
+    assert points[0] == points[1]
+    assert len(points[0]) == 3
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_backends_agree_on_random_edits(tmp_path, seed):
+    results = {}
+    for extension in EXTENSIONS:
+        directory = tmp_path / extension.lstrip('.')
+        directory.mkdir()
+        core = open_core(directory, extension)
+        if isinstance(core.storage, tg.JournaledStorage):
+            # Compact often so segments are folded into snapshots mid-run
+            core.storage.compact_threshold = 7
+        random_edits(core, seed, steps=60)
+        expected = all_days(core)
+        core.close()
+        assert reopened_days(directory, extension) == expected, extension
+        results[extension] = expected
+    assert results['.tgb'] == results['.json']
+    assert results['.db'] == results['.json']
+
+
+def test_big_file_progress_is_reported_by_tenths(tmp_path):
+    reports = []
+    storage = tg.JournaledStorage(str(tmp_path / 'data.json'),
+                                  on_progress=lambda *report: reports.append(report))
+    total = 40 << 20
+    for done in range(0, total + 1, 1 << 20):
+        storage.report_progress(done, total)
+    assert reports == [(percent, storage.path, 40) for percent in range(0, 101, 10)]
+    # Small files are read too quickly to be worth reporting
+    storage.report_progress(1, 2)
+    assert len(reports) == 11
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 8, 64])
+def test_json_object_reader_splits_numbers_across_chunks(tmp_path, chunk_size):
+    document = {'a': 1.5e10, 'b': -12.25, 'c': 123456789, 'd': [1e-3, 2E+2, 0], 'e': 'x', 'f': 7}
+    path = tmp_path / 'object.json'
+    path.write_text(json.dumps(document, separators=(',', ':')))
+    with open(path, 'rb') as f:
+        assert dict(tg.JsonObjectReader(f, chunk_size=chunk_size)) == document
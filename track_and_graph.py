@@ -1,158 +1,2501 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Measured from here by --benchmark-startup
 import tkinter as tk
 from tkinter import ttk
+from tkinter import filedialog
+from tkinter import font as tkfont
 from datetime import datetime, timedelta
 import json
 import os
 import copy
-import matplotlib
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+import sqlite3
+import threading
+import queue
+import argparse
+import logging
+import sys
+import functools
+import codecs
+import hashlib
+import mmap
+import random
+import re
+import struct
+import shutil
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import numpy as np
+
+# One logger per subsystem so traces can be switched on where they are needed
+log = logging.getLogger('track_and_graph')
+storage_log = logging.getLogger('track_and_graph.storage')
+tracking_log = logging.getLogger('track_and_graph.tracking')
+graphs_log = logging.getLogger('track_and_graph.graphs')
+settings_log = logging.getLogger('track_and_graph.settings')
+LOG_SUBSYSTEMS = ('storage', 'tracking', 'graphs', 'settings')
+
+
+def configure_logging(debug_subsystems=()):
+    # Quiet by default: only warnings and errors. Subsystems listed in debug_subsystems (or
+    # 'all') log their debug traces to stdout the way the old print statements did.
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(handler)
+    log.setLevel(logging.WARNING)
+    for name in debug_subsystems:
+        logger = log if name == 'all' else logging.getLogger('track_and_graph.' + name)
+        logger.setLevel(logging.DEBUG)
+
+
+class PerfStats:
+    # Call counts, latency histograms and data size for the hot paths. Histogram buckets
+    # are powers of two in milliseconds; the last bucket holds everything slower.
+    BUCKET_LIMITS_MS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+    def __init__(self):
+        self.lock = threading.Lock()  # The save worker records from its own thread
+        self.operations = {}
+
+    def record(self, name, elapsed_ms, data_size=None):
+        with self.lock:
+            stats = self.operations.get(name)
+            if stats is None:
+                stats = self.operations[name] = {
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'buckets': [0] * (len(self.BUCKET_LIMITS_MS) + 1), 'data_size': None
+                }
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            bucket = 0
+            while bucket < len(self.BUCKET_LIMITS_MS) and elapsed_ms > self.BUCKET_LIMITS_MS[bucket]:
+                bucket += 1
+            stats['buckets'][bucket] += 1
+            if data_size is not None:
+                stats['data_size'] = data_size
+
+    @contextmanager
+    def timed(self, name, data_size=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000, data_size)
+
+    def percentile_ms(self, stats, fraction):
+        # Upper bound of the bucket holding the given fraction of calls
+        needed = stats['count'] * fraction
+        seen = 0
+        for bucket, count in enumerate(stats['buckets']):
+            seen += count
+            if seen >= needed and count:
+                return self.BUCKET_LIMITS_MS[bucket] if bucket < len(self.BUCKET_LIMITS_MS) else stats['max_ms']
+        return 0.0
+
+    def snapshot(self):
+        with self.lock:
+            return {name: dict(stats, buckets=list(stats['buckets'])) for name, stats in self.operations.items()}
+
+    def export_json(self, path, extra=None):
+        report = {
+            'bucket_limits_ms': list(self.BUCKET_LIMITS_MS),
+            'operations': self.snapshot(),
+        }
+        report.update(extra or {})
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+perf_stats = PerfStats()
+
+
+# matplotlib is imported by import_matplotlib the first time the Graphs tab is opened
+Figure = None
+TimedFigureCanvas = None
+mdates = None
+
+
+def import_matplotlib():
+    global Figure, TimedFigureCanvas, mdates
+    if Figure is not None:
+        return
+    with perf_stats.timed('import matplotlib'):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure as MatplotlibFigure
+        import matplotlib.dates as matplotlib_dates
+
+    class FigureCanvas(FigureCanvasTkAgg):
+        # Full redraws show up in the diagnostics as canvas.draw
+        def draw(self):
+            with perf_stats.timed('canvas.draw'):
+                super().draw()
+
+    Figure = MatplotlibFigure
+    TimedFigureCanvas = FigureCanvas
+    mdates = matplotlib_dates
+    graphs_log.debug("Imported matplotlib.")
+
+
+def timed_method(name):
+    # Records a TrackerCore or DailyTrackingApp method in perf_stats along with the current
+    # number of dates
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                data = getattr(getattr(self, 'core', self), 'data', None)
+                perf_stats.record(name, (time.perf_counter() - start) * 1000,
+                                  len(data) if data is not None else None)
+        return wrapper
+    return decorator
+
+
+GRAPHABLE_TYPES = ("float", "int", "complete/incomplete")
+
+
+def join_path(parent_path, name):
+    return f"{parent_path}/{name}" if parent_path else name
+
+
+def node_id_for_path(path):
+    # Folders and items are identified by a 48-bit id taken from the path they were created
+    # at, so the same item on different days gets the same id and keeps it when moved.
+    # Nodes saved before ids existed get theirs the same way when they are loaded.
+    return int.from_bytes(hashlib.blake2b(path.encode('utf-8'), digest_size=6).digest(), 'big')
+
+
+def assign_node_ids(node, parent_path=''):
+    # Give every folder and item under node that has no id one from its path
+    for folder in node.get('folders', []):
+        folder_path = join_path(parent_path, folder['name'])
+        if 'id' not in folder:
+            folder['id'] = node_id_for_path(folder_path)
+        assign_node_ids(folder, folder_path)
+    for item in node.get('items', []):
+        if 'id' not in item:
+            item['id'] = node_id_for_path(join_path(parent_path, item['name']))
+
+
+def find_child(nodes, name):
+    for node in nodes:
+        if node['name'] == name:
+            return node
+    return None
+
+
+def resolve_node(day_data, path):
+    # Follow a "Folder/Sub/Item" path the same way get_item_by_path does: folders first, then items
+    node = day_data
+    for key in path.split('/') if path else []:
+        child = find_child(node.get('folders', []), key) or find_child(node.get('items', []), key)
+        if child is None:
+            return None
+        node = child
+    return node
+
+
+def resolve_folder(day_data, path):
+    # Deepest folder along the path; selecting an item adds next to it rather than inside it
+    folder = day_data
+    for key in path.split('/') if path else []:
+        child = find_child(folder.get('folders', []), key)
+        if child is None:
+            break
+        folder = child
+    return folder
+
+
+class PathIndex:
+    # Full path -> node for one day's nested dict, so lookups are a single hash lookup instead
+    # of a scan of the sibling lists at every level. Resolves paths the same way resolve_node
+    # and resolve_folder do.
+    def __init__(self, day_data):
+        self.day_data = day_data
+        self.nodes = {'': day_data}
+        self.ids = {}  # node id -> node
+        self.add_children(day_data, '')
+
+    def add_children(self, node, parent_path):
+        # Folders before items and the first of duplicate names wins, like resolve_node
+        for folder in node.get('folders', []):
+            self.add(parent_path, folder)
+        for item in node.get('items', []):
+            self.add(parent_path, item)
+
+    def add(self, parent_path, node):
+        path = join_path(parent_path, node['name'])
+        existing = self.nodes.get(path)
+        if existing is not None:
+            if 'type' not in existing or 'type' in node:
+                return
+            # A folder added next to an item of the same name shadows it
+            self.drop(path, existing)
+        self.nodes[path] = node
+        self.ids.setdefault(node.get('id'), node)
+        if 'type' not in node:
+            self.add_children(node, path)
+
+    def get(self, path):
+        return self.nodes.get(path)
+
+    def get_by_id(self, node_id):
+        return self.ids.get(node_id)
+
+    def move(self, old_path, parent_path, node):
+        # Re-key a node that moved to parent_path, along with everything under it
+        self.drop(old_path, node)
+        self.add(parent_path, node)
+
+    def drop(self, path, node):
+        if self.nodes.get(path) is node:
+            del self.nodes[path]
+        if self.ids.get(node.get('id')) is node:
+            del self.ids[node['id']]
+        for child in node.get('folders', []) + node.get('items', []) if 'type' not in node else []:
+            self.drop(join_path(path, child['name']), child)
+
+    def folder_path(self, path):
+        # Path of the deepest folder along path, like resolve_folder
+        while path:
+            node = self.nodes.get(path)
+            if node is not None and 'type' not in node:
+                return path
+            path = path.rpartition('/')[0]
+        return ''
+
+
+def default_value(item_type):
+    if item_type == "complete/incomplete":
+        return False
+    elif item_type in ["float", "int"]:
+        return 0
+    elif item_type == "string":
+        return ""
+    else:
+        return None
+
+
+def clear_values(data_dict):
+    if 'folders' in data_dict:
+        for folder in data_dict['folders']:
+            clear_values(folder)
+    if 'items' in data_dict:
+        for item in data_dict['items']:
+            item['value'] = default_value(item['type'])
+
+
+def move_applies(path, parent_path, source, node, destination):
+    # Whether moving node (at path, under source) into destination (at parent_path) does
+    # anything. The destination has to be a folder outside the node's own subtree, and the
+    # node can't join a folder that already has a child with its name, whose path it would take.
+    if not path or node is None or destination is None or 'type' in destination:
+        return False
+    if parent_path == path or parent_path.startswith(path + '/'):
+        return False
+    if destination is not source:
+        siblings = destination.get('folders', []) + destination.get('items', [])
+        return all(sibling['name'] != node['name'] for sibling in siblings)
+    return True
+
+
+def apply_change(data, change):
+    # Apply one change record to the data. The same function updates the live data and
+    # replays the journal on load, so both always agree.
+    op = change['op']
+    date = change['date']
+    if op == 'set_day':
+        data[date] = copy.deepcopy(change['day'])
+        return
+    if op == 'copy_day':
+        if isinstance(data, LazyDateStore):
+            data.copy_day(change['source'], date, change['values'])
+        else:
+            day_data = copy.deepcopy(data[change['source']])
+            if not change['values']:
+                clear_values(day_data)
+            data[date] = day_data
+        return
+    if date not in data:
+        data[date] = {'folders': [], 'items': []}
+    day_data = data[date]
+    if op == 'add_folder':
+        parent = resolve_folder(day_data, change['parent'])
+        parent.setdefault('folders', [])
+        if find_child(parent['folders'], change['name']) is None:
+            folder = {'name': change['name'], 'folders': [], 'items': []}
+            if 'id' in change:
+                folder['id'] = change['id']
+            parent['folders'].append(folder)
+            if 'id' not in folder:
+                # Recorded before ids existed
+                assign_node_ids(day_data)
+    elif op == 'add_item':
+        parent = resolve_folder(day_data, change['parent'])
+        parent.setdefault('items', [])
+        if find_child(parent['items'], change['item']['name']) is None:
+            parent['items'].append(copy.deepcopy(change['item']))
+            if 'id' not in change['item']:
+                assign_node_ids(day_data)
+    elif op == 'set_value':
+        item = resolve_node(day_data, change['path'])
+        if item is not None and 'type' in item:
+            item['value'] = change['value']
+    elif op == 'move':
+        # Splice one node out of its parent's list and into the destination folder's list at
+        # index (counted among the destination's folders or items, whichever the node is)
+        path = change['path']
+        source = resolve_node(day_data, path.rpartition('/')[0])
+        node = resolve_node(day_data, path)
+        destination = resolve_node(day_data, change['parent'])
+        if not move_applies(path, change['parent'], source, node, destination):
+            return
+        siblings = source['items' if 'type' in node else 'folders']
+        del siblings[next(index for index, sibling in enumerate(siblings) if sibling is node)]
+        destination.setdefault('items' if 'type' in node else 'folders', []).insert(change['index'], node)
+    else:
+        raise ValueError("Unknown change op: %s" % op)
+
+
+class SchemaVersion:
+    # One distinct folder/item layout: every key except the values, as nested tuples so the
+    # layout itself can be the lookup key. Days that share a layout share one SchemaVersion
+    # and only keep a tuple of their values, in the order the items appear in the layout.
+    def __init__(self, number, layout):
+        self.number = number
+        self.layout = layout
+        self.types = []
+        self.graph_items = []  # (value index, node id, path, type) for graphable items
+        self.collect(layout, '')
+        self.defaults = tuple(default_value(item_type) for item_type in self.types)
+
+    def collect(self, layout, parent_path):
+        fields, folders, items = layout
+        for folder in folders:
+            self.collect(folder, join_path(parent_path, dict(folder[0])['name']))
+        for item_fields in items:
+            item = dict(item_fields)
+            if item['type'] in GRAPHABLE_TYPES:
+                self.graph_items.append((len(self.types), item.get('id'), join_path(parent_path, item['name']),
+                                         item['type']))
+            self.types.append(item['type'])
+
+    def expand(self, values):
+        values = iter(values)
+
+        def build(layout):
+            fields, folders, items = layout
+            node = dict(fields)
+            node['folders'] = [build(folder) for folder in folders]
+            node['items'] = []
+            for item_fields in items:
+                item = dict(item_fields)
+                item['value'] = next(values)
+                node['items'].append(item)
+            return node
+        return build(self.layout)
+
+
+class CompactDay:
+    # A day held as a schema version plus its values
+    __slots__ = ('schema', 'values')
+
+    def __init__(self, schema, values):
+        self.schema = schema
+        self.values = values
+
+
+def split_day(node, values):
+    # Layout tuple for node, appending its item values to values in layout order
+    fields = tuple((key, value) for key, value in node.items() if key not in ('folders', 'items'))
+    folders = tuple(split_day(folder, values) for folder in node.get('folders', []))
+    items = []
+    for item in node.get('items', []):
+        items.append(tuple((key, value) for key, value in item.items() if key != 'value'))
+        values.append(item.get('value'))
+    return fields, folders, tuple(items)
+
+
+class LazyDateStore(MutableMapping):
+    # The {date: day} mapping the app works on. Every known date is listed up front but a
+    # day is only read from the backend the first time it is accessed.
+    #
+    # Days are kept as CompactDay so the folder/item layout is stored once per distinct
+    # schema version. Only the max_expanded most recently used days are held as the nested
+    # dicts the UI edits; older ones are folded back into their compact form.
+    def __init__(self, backend, max_expanded=8):
+        self.backend = backend
+        self.dates = set(backend.list_dates())
+        self.days = {}
+        self.schemas = {}  # layout -> SchemaVersion
+        self.expanded = OrderedDict()  # dates currently held as dicts, most recent last
+        self.max_expanded = max_expanded
+
+    def __getitem__(self, date):
+        day_data = self.days.get(date)
+        if day_data is None:
+            if date not in self.dates:
+                raise KeyError(date)
+            day_data = self.backend.load_day(date)
+            assign_node_ids(day_data)
+            storage_log.debug("Lazily loaded date: %s", date)
+        elif isinstance(day_data, CompactDay):
+            day_data = day_data.schema.expand(day_data.values)
+        self.days[date] = day_data
+        self.touch(date)
+        return day_data
+
+    def __setitem__(self, date, day_data):
+        assign_node_ids(day_data)
+        self.days[date] = day_data
+        self.dates.add(date)
+        self.touch(date)
+
+    def __delitem__(self, date):
+        self.dates.remove(date)
+        self.days.pop(date, None)
+        self.expanded.pop(date, None)
+
+    def touch(self, date):
+        self.expanded[date] = True
+        self.expanded.move_to_end(date)
+        while len(self.expanded) > self.max_expanded:
+            old_date, _ = self.expanded.popitem(last=False)
+            self.days[old_date] = self.compact(self.days[old_date])
+
+    def compact(self, day_data):
+        if isinstance(day_data, CompactDay):
+            return day_data
+        values = []
+        layout = split_day(day_data, values)
+        schema = self.schemas.get(layout)
+        if schema is None:
+            schema = self.schemas[layout] = SchemaVersion(len(self.schemas), layout)
+            storage_log.debug("Registered schema version %s", schema.number)
+        return CompactDay(schema, tuple(values))
+
+    def copy_day(self, source, date, keep_values):
+        # The new day references the source's schema version; only the value tuple is new
+        if source not in self.days:
+            self[source]
+        compact_source = self.compact(self.days[source])
+        values = compact_source.values if keep_values else compact_source.schema.defaults
+        self.days[date] = CompactDay(compact_source.schema, values)
+        self.dates.add(date)
+        self.expanded.pop(date, None)
+
+    def graph_items(self, date):
+        # (node id, path, type, value) for each graphable item; compact days are read without expanding
+        day_data = self.days.get(date)
+        if day_data is None:
+            day_data = self[date]
+        if isinstance(day_data, CompactDay):
+            values = day_data.values
+            return [(node_id, path, item_type, values[index])
+                    for index, node_id, path, item_type in day_data.schema.graph_items]
+        return [(item['id'], path, item['type'], item['value']) for path, item in iter_graph_items(day_data)]
+
+    def __contains__(self, date):
+        return date in self.dates
+
+    def __iter__(self):
+        return iter(sorted(self.dates))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def is_loaded(self, date):
+        return date in self.days
+
+    def missing_dates(self):
+        return sorted(date for date in self.dates if date not in self.days)
+
+    def add_loaded(self, date, day_data):
+        # A day read outside __getitem__ (load_all or a background loader), kept compact. If the
+        # day was loaded in the meantime that copy is kept, since it may have been edited.
+        if date in self.days:
+            return False
+        assign_node_ids(day_data)
+        self.days[date] = self.compact(day_data)
+        return True
+
+    def stored_series(self, node_ids):
+        # {node id: (type, dates, values)} as the backend stores them, or None if it can't read
+        # them without reading the days. Only the dates not loaded yet are still exactly as stored.
+        return self.backend.snapshot_series(node_ids)
+
+    def load_all(self):
+        missing = self.missing_dates()
+        if missing:
+            for date, day_data in self.backend.load_days(missing).items():
+                self.add_loaded(date, day_data)
+            storage_log.debug("Loaded remaining %s dates.", len(missing))
+
+
+def series_value(item_type, value):
+    # The number plotted for a stored value; booleans become 0/1, None when it can't be graphed
+    if item_type == "complete/incomplete":
+        return 1.0 if value else 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_graph_items(node, parent_path=''):
+    # (path, item) for every graphable item under node
+    for folder in node.get('folders', []):
+        yield from iter_graph_items(folder, join_path(parent_path, folder['name']))
+    for item in node.get('items', []):
+        if item['type'] in GRAPHABLE_TYPES:
+            yield join_path(parent_path, item['name']), item
+
+
+class SeriesColumn:
+    # One item's history as parallel date/value arrays sorted by date. The arrays keep
+    # spare capacity at the end so appending a new day doesn't reallocate every time.
+    def __init__(self, item_type, dates=None, values=None):
+        self.item_type = item_type
+        if dates is None:
+            dates = np.empty(0, dtype='datetime64[D]')
+            values = np.empty(0, dtype=np.float64)
+        self.size = len(dates)
+        capacity = max(16, self.size)
+        self.dates = np.empty(capacity, dtype='datetime64[D]')
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.dates[:self.size] = dates
+        self.values[:self.size] = values
+
+    def series(self):
+        return self.dates[:self.size], self.values[:self.size]
+
+    def set(self, date, value):
+        # True if the series changed
+        day = np.datetime64(date, 'D')
+        position = int(np.searchsorted(self.dates[:self.size], day))
+        if position < self.size and self.dates[position] == day:
+            if self.values[position] == value:
+                return False
+            self.values[position] = value
+            return True
+        if self.size == len(self.dates):
+            self.dates = np.concatenate([self.dates, np.empty(self.size, dtype='datetime64[D]')])
+            self.values = np.concatenate([self.values, np.empty(self.size, dtype=np.float64)])
+        self.dates[position + 1:self.size + 1] = self.dates[position:self.size]
+        self.values[position + 1:self.size + 1] = self.values[position:self.size]
+        self.dates[position] = day
+        self.values[position] = value
+        self.size += 1
+        return True
+
+    def remove(self, date):
+        # True if there was a point to remove
+        day = np.datetime64(date, 'D')
+        position = int(np.searchsorted(self.dates[:self.size], day))
+        if position < self.size and self.dates[position] == day:
+            self.dates[position:self.size - 1] = self.dates[position + 1:self.size]
+            self.values[position:self.size - 1] = self.values[position + 1:self.size]
+            self.size -= 1
+            return True
+        return False
+
+
+# Aggregation mode -> days covered by one bar before any downsampling
+AGGREGATIONS = OrderedDict([
+    ("Daily", 1),
+    ("Weekly total", 7),
+    ("Monthly total", 30),
+    ("Rolling mean (7 days)", 1),
+    ("Completion rate (weekly)", 7),
+])
+# Aggregation modes that only mean something for one item type
+AGGREGATION_TYPES = {"Completion rate (weekly)": 'complete/incomplete'}
+
+
+def aggregations_for(item_types):
+    # The aggregation modes that apply to items of every one of item_types
+    return [mode for mode in AGGREGATIONS
+            if mode not in AGGREGATION_TYPES or set(item_types) <= {AGGREGATION_TYPES[mode]}]
+
+
+def aggregate_series(dates, values, mode):
+    # (dates, values) for the chosen aggregation; weekly buckets start on Monday and are
+    # labelled with their first day, monthly ones with the first of the month
+    if mode == "Daily" or len(values) == 0:
+        return dates, values
+    if mode == "Rolling mean (7 days)":
+        # Mean of the recorded days in the 7 calendar days ending at each date
+        day_numbers = dates.astype(np.int64)
+        totals = np.concatenate([[0.0], np.cumsum(values)])
+        window_start = np.searchsorted(day_numbers, day_numbers - 6)
+        window_end = np.arange(1, len(values) + 1)
+        return dates, (totals[window_end] - totals[window_start]) / (window_end - window_start)
+    if mode == "Monthly total":
+        bucket_dates = dates.astype('datetime64[M]').astype('datetime64[D]')
+    else:
+        # Day 0 (1970-01-01) was a Thursday, so shifting by 3 makes weeks start on Monday
+        day_numbers = dates.astype(np.int64)
+        bucket_dates = ((day_numbers + 3) // 7 * 7 - 3).astype('datetime64[D]')
+    bucket_starts, bucket_index = np.unique(bucket_dates, return_inverse=True)
+    if mode == "Completion rate (weekly)":
+        done = np.bincount(bucket_index, weights=(values > 0).astype(np.float64))
+        return bucket_starts, done / np.bincount(bucket_index)
+    return bucket_starts, np.bincount(bucket_index, weights=values)
+
+
+def downsample_series(dates, values, max_points):
+    # Average runs of consecutive points so at most max_points bars are drawn; each bar is
+    # labelled with the first date of its run
+    if len(values) <= max_points:
+        return dates, values
+    starts = np.unique(np.linspace(0, len(values), max_points, endpoint=False).astype(np.int64))
+    counts = np.diff(np.append(starts, len(values)))
+    return dates[starts], np.add.reduceat(values, starts) / counts
+
+
+class SeriesIndex:
+    # Item id -> SeriesColumn, filled in on demand by load and then kept up to date with
+    # each change so plotting an item again never has to walk the history. Keyed by id, a
+    # series follows its item through moves and renames.
+    def __init__(self):
+        self.columns = {}
+        self.date_ids = {}  # date -> ids indexed for that date, so a day can be re-indexed
+
+    def load(self, node_ids, data):
+        # Index every id not indexed yet in one pass over the history; items with nothing
+        # to plot get an empty column so they aren't scanned for again
+        missing = set(node_ids) - self.columns.keys()
+        if not missing:
+            return
+        points = {node_id: (None, [], []) for node_id in missing}
+        # A backend that can query an item's values gives the points of the days not loaded
+        # yet without reading them; only the loaded days, which may have been edited, are walked
+        stored = data.stored_series(missing)
+        walked = sorted(data)
+        unread = []
+        if stored is not None:
+            unread = [date for date in walked if not data.is_loaded(date)]
+            walked = [date for date in walked if data.is_loaded(date)]
+        for date in walked:
+            for node_id, path, item_type, value in data.graph_items(date):
+                if node_id not in missing:
+                    continue
+                value = series_value(item_type, value)
+                if value is None:
+                    continue
+                _, dates, values = points[node_id]
+                points[node_id] = (item_type, dates, values)
+                dates.append(date)
+                values.append(value)
+                self.date_ids.setdefault(date, set()).add(node_id)
+        for node_id, (item_type, dates, values) in points.items():
+            dates = np.array(dates, dtype='datetime64[D]')
+            values = np.array(values, dtype=np.float64)
+            if stored is not None and node_id in stored:
+                stored_type, stored_dates, stored_values = stored[node_id]
+                keep = np.isin(stored_dates, np.array(unread, dtype='datetime64[D]'))
+                for date in stored_dates[keep].astype(str):
+                    self.date_ids.setdefault(date, set()).add(node_id)
+                dates = np.concatenate([dates, stored_dates[keep]])
+                values = np.concatenate([values, stored_values[keep]])
+                order = np.argsort(dates, kind='stable')
+                dates, values = dates[order], values[order]
+                item_type = item_type or stored_type
+            self.columns[node_id] = SeriesColumn(item_type, dates, values)
+        graphs_log.debug("Indexed %s series in one pass (%s indexed in total).", len(missing), len(self.columns))
+
+    def update(self, change, data):
+        # Returns the set of ids whose series changed, for invalidating anything derived from them
+        date = change['date']
+        if change['op'] == 'set_value':
+            item = resolve_node(data[date], change['path'])
+            if item is not None and 'type' in item:
+                if self.set_point(date, item['id'], item['type'], item['value']):
+                    return {item['id']}
+        elif change['op'] not in ('add_folder', 'move'):
+            # A move keeps every id and value, so no series changes
+            return self.reindex_day(date, data)
+        return set()
+
+    def reindex_day(self, date, data):
+        changed = set()
+        old_ids = self.date_ids.get(date, set())
+        self.date_ids[date] = set()
+        for node_id, path, item_type, value in data.graph_items(date):
+            if self.set_point(date, node_id, item_type, value):
+                changed.add(node_id)
+        for node_id in old_ids - self.date_ids[date]:
+            if self.remove_point(date, node_id):
+                changed.add(node_id)
+        return changed
+
+    def set_point(self, date, node_id, item_type, value):
+        # Ids that haven't been loaded yet will pick the change up when they are
+        if item_type not in GRAPHABLE_TYPES or node_id not in self.columns:
+            return False
+        value = series_value(item_type, value)
+        if value is None:
+            return self.remove_point(date, node_id)
+        column = self.columns[node_id]
+        column.item_type = item_type
+        self.date_ids.setdefault(date, set()).add(node_id)
+        return column.set(date, value)
+
+    def remove_point(self, date, node_id):
+        self.date_ids.get(date, set()).discard(node_id)
+        column = self.columns.get(node_id)
+        return column is not None and column.remove(date)
+
+    def series(self, node_id):
+        # (dates, values) array views, or None if the item has nothing to plot
+        column = self.columns.get(node_id)
+        return column.series() if column is not None and column.size else None
+
+
+class CatalogEntry:
+    # What the catalog knows about one item. path and item_type are from the latest date it appears on.
+    __slots__ = ('path', 'item_type', 'first_date', 'last_date', 'count')
+
+    def __init__(self, path, item_type, date):
+        self.path = path
+        self.item_type = item_type
+        self.first_date = date
+        self.last_date = date
+        self.count = 1
+
+    def add(self, date, path, item_type):
+        self.count += 1
+        self.first_date = min(self.first_date, date)
+        if date >= self.last_date:
+            self.last_date = date
+            self.path = path
+            self.item_type = item_type
+
+
+class ItemCatalog:
+    # Every graphable item ever recorded, by id, in the order they were first seen. Built
+    # with one pass over the history and then kept current one day at a time, so the graph
+    # selector is drawn from here instead of rescanning every date.
+    def __init__(self):
+        self.entries = {}  # node id -> CatalogEntry
+        self.date_ids = {}  # date -> ids of the items on that date
+
+    def update(self, change, data):
+        # The ids whose entries changed, were added or were removed. Values don't matter to
+        # the catalog, so set_value never changes it.
+        if change['op'] == 'set_value':
+            return set()
+        return self.update_day(change['date'], data)
+
+    def update_day(self, date, data):
+        old_ids = set(self.date_ids.get(date, ()))
+        day_items = {}
+        for node_id, path, item_type, value in data.graph_items(date):
+            day_items.setdefault(node_id, (path, item_type))
+        changed = set()
+        for node_id, (path, item_type) in day_items.items():
+            entry = self.entries.get(node_id)
+            if entry is None:
+                self.entries[node_id] = CatalogEntry(path, item_type, date)
+                changed.add(node_id)
+            elif node_id not in old_ids:
+                entry.add(date, path, item_type)
+                changed.add(node_id)
+            elif date == entry.last_date and (entry.path, entry.item_type) != (path, item_type):
+                entry.path = path
+                entry.item_type = item_type
+                changed.add(node_id)
+        self.date_ids[date] = tuple(day_items)
+        for node_id in old_ids - day_items.keys():
+            self.remove_occurrence(node_id, date, data)
+            changed.add(node_id)
+        return changed
+
+    def remove_occurrence(self, node_id, date, data):
+        entry = self.entries[node_id]
+        entry.count -= 1
+        if entry.count == 0:
+            del self.entries[node_id]
+            return
+        if date in (entry.first_date, entry.last_date):
+            # Only a whole-day replacement removes items, so this is rare enough to rescan dates
+            dates = [day for day, ids in self.date_ids.items() if node_id in ids]
+            entry.first_date = min(dates)
+            entry.last_date = max(dates)
+            for day_id, path, item_type, value in data.graph_items(entry.last_date):
+                if day_id == node_id:
+                    entry.path = path
+                    entry.item_type = item_type
+                    break
+
+    def tree(self):
+        # {'folders': {name: subtree}, 'items': [(name, node id)]} from each item's latest path
+        root = {'folders': {}, 'items': []}
+        for node_id, entry in self.entries.items():
+            node = root
+            *folder_names, item_name = entry.path.split('/')
+            for folder_name in folder_names:
+                node = node['folders'].setdefault(folder_name, {'folders': {}, 'items': []})
+            node['items'].append((item_name, node_id))
+        return root
+
+
+class GraphCache:
+    # Bounded LRU of things derived from item series. Keys are tuples starting with the item
+    # id, so everything for an item can be dropped when its series changes.
+    def __init__(self, max_entries):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, node_ids):
+        for key in [key for key in self.entries if key[0] in node_ids]:
+            del self.entries[key]
+
+
+class JsonObjectReader:
+    # Iterates over the (key, value) members of the JSON object in a binary file, decoding
+    # one member at a time. Only the member being parsed and the text read ahead of it are
+    # held in memory, rather than the whole document as with json.load. progress, if given,
+    # is called with (bytes read, file size) after each member.
+    WHITESPACE = ' \t\r\n'
+    NUMBER_CONTINUATION = '0123456789.eE+-'
+
+    def __init__(self, f, progress=None, chunk_size=1 << 16):
+        self.f = f
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.size = os.fstat(f.fileno()).st_size
+        self.bytes_read = 0
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def __iter__(self):
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            key = self.decode()
+            self.expect(':')
+            value = self.decode()
+            if self.progress is not None:
+                self.progress(self.bytes_read, self.size)
+            yield key, value
+            if self.expect(',}') == '}':
+                return
+
+    def fill(self, size):
+        # Drop what has been parsed and append at least size more bytes of text
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.position:] + self.text.decode(chunk, final=self.eof)
+        self.position = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in self.WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer) or not self.fill(self.chunk_size):
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError("Expected one of %r at byte %s" % (characters, self.bytes_read))
+        self.position += 1
+        return character
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number may continue in the next chunk (after "1", "1." or "1e"), so a value is
+                # only complete once something that can't be part of a number follows it
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in self.NUMBER_CONTINUATION):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Read at least as much again as is buffered so long values are not re-parsed too often
+            self.fill(max(self.chunk_size, len(self.buffer)))
+
+
+class StorageBackend:
+    # What TrackerCore talks to. load returns a LazyDateStore and append persists one change
+    # record (see apply_change). snapshot_series returns {node id: (type, dates, values)} of
+    # the points the given items plot as, read without loading whole days, or None when the
+    # backend has no faster way to do that than scanning the days. Items missing from the
+    # result have no points stored.
+    def load(self):
+        raise NotImplementedError
+
+    def list_dates(self):
+        raise NotImplementedError
+
+    def load_day(self, date):
+        raise NotImplementedError
+
+    def load_days(self, dates):
+        return {date: self.load_day(date) for date in dates}
+
+    def iter_days(self, dates, batch_size=64):
+        # (date, day) pairs read a batch at a time, so a background loader can hand days over
+        # as they arrive without the backend holding its lock for the whole history
+        for start in range(0, len(dates), batch_size):
+            yield from self.load_days(dates[start:start + batch_size]).items()
+
+    def append(self, change):
+        raise NotImplementedError
+
+    def append_many(self, changes):
+        for change in changes:
+            self.append(change)
+
+    def snapshot_series(self, node_ids):
+        return None
 
-print("Imported necessary modules.")
+    def close(self):
+        pass
+
+
+class JournaledStorage(StorageBackend):
+    # tracking_data.json is a snapshot; every mutation appends one JSON line to
+    # tracking_data.json.journal. Once the journal grows past compact_threshold
+    # records it is renamed to a .compacting segment and a background thread folds
+    # it into a new snapshot, which replaces the old one atomically.
+    #
+    # The snapshot is still one JSON object, but written with one date per line, and
+    # tracking_data.json.index records the byte range of each line so a single day can be
+    # read without parsing the rest of the file.
+    #
+    # on_progress, if given, is called with (percent, path, size in MB) as a big snapshot is
+    # read in full, on the thread reading it; without it progress only goes to the debug log.
+    DAY_LINE = re.compile(rb'"\d{4}-\d{2}-\d{2}": \{.*\},?')
+
+    def __init__(self, path, compact_threshold=200, on_progress=None):
+        self.path = path
+        self.on_progress = on_progress
+        self.journal_path = path + '.journal'
+        self.compacting_path = path + '.journal.compacting'
+        self.absorbed_path = path + '.journal.absorbed'
+        self.index_path = path + '.index'
+        self.temp_path = path + '.tmp'
+        self.compact_threshold = compact_threshold
+        self.lock = threading.Lock()
+        self.journal = None
+        self.journal_records = 0
+        self.compaction_thread = None
+        self.offsets = {}
+        self.progress_tenth = None  # Last tenth of a big snapshot reported by report_progress
+
+    def load(self):
+        # An absorbed segment means we crashed after the new snapshot was fully written
+        if os.path.exists(self.absorbed_path):
+            storage_log.debug("Found absorbed journal segment. Installing its snapshot.")
+            if os.path.exists(self.temp_path):
+                os.replace(self.temp_path, self.path)
+            os.remove(self.absorbed_path)
+        self.open_snapshot()
+        # A segment left behind means we crashed mid-compaction; redo it
+        if os.path.exists(self.compacting_path):
+            storage_log.debug("Found unfinished compaction. Completing it.")
+            self.compact_segment()
+        data = LazyDateStore(self)
+        self.journal_records = self.replay(self.journal_path, data, truncate_torn=True)
+        storage_log.debug("Replayed %s journal records.", self.journal_records)
+        return data
+
+    def open_snapshot(self):
+        if not os.path.exists(self.path):
+            storage_log.debug("No existing snapshot. Starting empty.")
+            self.offsets = {}
+            return
+        stat = os.stat(self.path)
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index['size'] == stat.st_size and index['mtime_ns'] == stat.st_mtime_ns:
+                self.offsets = index['dates']
+                storage_log.debug("Loaded snapshot index with %s dates.", len(self.offsets))
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+        # Missing or stale index (e.g. a crash between snapshot and index writes): rebuild it
+        offsets = self.scan_offsets()
+        if offsets is None:
+            # Written by an older version as a single line; rewrite it once in the line format,
+            # streaming one date at a time from the old file into the new one
+            storage_log.debug("Converting snapshot to one date per line.")
+            with open(self.path, 'rb') as f:
+                self.install_snapshot(self.write_snapshot_lines(JsonObjectReader(f, self.report_progress)))
+        else:
+            self.offsets = offsets
+            self.write_index()
+
+    def scan_offsets(self):
+        # Only the key at the start of each line is decoded, the day itself is skipped. None
+        # unless every line is laid out as write_snapshot_lines writes it, so any other valid
+        # JSON (pretty-printed, say) is converted instead of being taken for an empty history.
+        offsets = {}
+        with open(self.path, 'rb') as f:
+            first_line = f.readline()
+            if first_line != b'{\n':
+                return None
+            position = len(first_line)
+            previous = b'{'
+            for line in f:
+                body = line.rstrip(b'\r\n')
+                # Each day line but the last ends with a comma, and the closing brace ends the file
+                more_days = previous == b'{' or previous.endswith(b',')
+                if body == b'}' and not previous.endswith(b','):
+                    previous = body
+                elif more_days and self.DAY_LINE.fullmatch(body):
+                    key_end = line.index(b'": ') + 1
+                    offsets[json.loads(line[:key_end])] = [position, len(body.rstrip(b','))]
+                    previous = body
+                else:
+                    return None
+                position += len(line)
+            if previous != b'}':
+                return None
+        storage_log.debug("Rebuilt snapshot index with %s dates.", len(offsets))
+        return offsets
+
+    def write_index(self):
+        stat = os.stat(self.path)
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'dates': self.offsets}, f)
+        os.replace(temp_path, self.index_path)
+
+    def list_dates(self):
+        return list(self.offsets)
+
+    def load_day(self, date):
+        return self.load_days([date])[date]
+
+    def load_days(self, dates):
+        # Under the lock so a compaction cannot swap the snapshot between offset lookup and read
+        days = {}
+        if not dates:
+            # There may be no snapshot yet
+            return days
+        with self.lock, open(self.path, 'rb') as f:
+            for date in dates:
+                offset, length = self.offsets[date]
+                f.seek(offset)
+                days[date] = json.loads(b'{' + f.read(length) + b'}')[date]
+        return days
+
+    def read_snapshot(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'rb') as f:
+            return dict(JsonObjectReader(f, self.report_progress))
+
+    def report_progress(self, done, total):
+        # Reported at every further tenth of a big file
+        if total < 16 << 20:
+            return
+        tenth = done * 10 // total
+        if tenth != self.progress_tenth:
+            self.progress_tenth = tenth
+            storage_log.debug("Read %s%% of %s (%s MB)", tenth * 10, self.path, total >> 20)
+            if self.on_progress is not None:
+                self.on_progress(tenth * 10, self.path, total >> 20)
+
+    def write_snapshot(self, data):
+        self.install_snapshot(self.write_snapshot_file(data))
+
+    def write_snapshot_file(self, data):
+        return self.write_snapshot_lines((date, data[date]) for date in sorted(data))
+
+    def write_snapshot_lines(self, days):
+        # Written to a temp file and renamed over the snapshot so a crash never leaves it
+        # truncated. days is any iterable of (date, day), consumed one at a time.
+        offsets = {}
+        with open(self.temp_path, 'wb') as f:
+            f.write(b'{\n')
+            position = 2
+            for date, day_data in days:
+                if offsets:
+                    f.write(b',\n')
+                    position += 2
+                line = (json.dumps(date) + ': ' + json.dumps(day_data)).encode('utf-8')
+                offsets[date] = [position, len(line)]
+                f.write(line)
+                position += len(line)
+            f.write(b'\n}\n' if offsets else b'}\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return offsets
+
+    def install_snapshot(self, offsets):
+        # Days that were never loaded are identical in the old and new snapshot, so lazy
+        # reads only need the swap and the new offsets to happen together
+        with self.lock:
+            os.replace(self.temp_path, self.path)
+            self.offsets = offsets
+            self.write_index()
+        storage_log.debug("Wrote snapshot to %s", self.path)
+
+    def read_journal(self, journal_path):
+        # (change, offset after it) for each record, up to a torn one
+        if not os.path.exists(journal_path):
+            return
+        good_offset = 0
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("Record has no line terminator")
+                    change = json.loads(line)
+                except ValueError:
+                    # Only the last record can be torn by a crash mid-append; everything before it is intact
+                    storage_log.warning("Ignoring torn journal record at offset %s", good_offset)
+                    return
+                good_offset += len(line)
+                yield change, good_offset
+
+    def replay(self, journal_path, data, truncate_torn=False):
+        count = 0
+        good_offset = 0
+        for change, good_offset in self.read_journal(journal_path):
+            apply_change(data, change)
+            count += 1
+        if truncate_torn and os.path.exists(journal_path) and good_offset < os.path.getsize(journal_path):
+            # Drop the torn tail so new records are not appended after garbage
+            with open(journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+        return count
+
+    def append(self, change):
+        self.append_many([change])
+
+    def append_many(self, changes):
+        # One write and one fsync for the whole batch
+        with self.lock:
+            if self.journal is None:
+                self.journal = open(self.journal_path, 'a')
+            self.journal.write(''.join(json.dumps(change) + '\n' for change in changes))
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.journal_records += len(changes)
+            should_compact = self.journal_records >= self.compact_threshold
+        if should_compact:
+            self.compact_in_background()
+
+    def compact_in_background(self):
+        with self.lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                return
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if not os.path.exists(self.journal_path):
+                return
+            os.replace(self.journal_path, self.compacting_path)
+            self.journal_records = 0
+            self.compaction_thread = threading.Thread(target=self.compact_segment, daemon=True)
+            self.compaction_thread.start()
+            storage_log.debug("Started background compaction.")
+
+    def compact_segment(self):
+        # Rebuilt from disk rather than from the live data so the UI thread is never blocked on
+        # it. Only the days the segment changes are held in memory; the rest are streamed from
+        # the old snapshot to the new one a batch at a time.
+        offsets = self.write_snapshot_lines(self.compacted_days(self.segment_days()))
+        # Records are not idempotent (copy_day reads another day), so a segment must never be
+        # replayed onto a snapshot that already contains it. Marking it absorbed only after the
+        # new snapshot is on disk lets load() finish either step after a crash.
+        os.replace(self.compacting_path, self.absorbed_path)
+        self.install_snapshot(offsets)
+        os.remove(self.absorbed_path)
+        storage_log.debug("Compacted journal into snapshot.")
+
+    def segment_days(self):
+        # {date: day} of the days the compacting segment changes, as it leaves them. Only those
+        # and the sources it copies from are read from the snapshot.
+        changes = [change for change, _ in self.read_journal(self.compacting_path)]
+        dates = {change['date'] for change in changes}
+        dates.update(change['source'] for change in changes if change['op'] == 'copy_day')
+        days = self.load_days(sorted(dates.intersection(self.list_dates())))
+        # Days saved before ids existed get them from the paths they were loaded at, as the app
+        # gives them, before a move or copy in the segment carries their nodes elsewhere
+        for day_data in days.values():
+            assign_node_ids(day_data)
+        for change in changes:
+            apply_change(days, change)
+        return days
+
+    def compacted_days(self, changed_days):
+        # (date, day) of the new snapshot: the old one's days in their order, with the changed
+        # ones swapped in, then the dates the segment added
+        for date, day_data in self.iter_days(self.list_dates()):
+            yield date, changed_days.pop(date, day_data)
+        yield from sorted(changed_days.items())
+
+    def close(self):
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+        with self.lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+        storage_log.debug("Closed storage.")
+
+
+class BinarySnapshot:
+    # Reader for the binary snapshot format BinarySnapshotStorage writes:
+    #
+    #   magic, header length (uint64), JSON header, then, each aligned to 8 bytes:
+    #   day_schemas  int32[days]          schema of each day from first_date, -1 if no entry
+    #   kinds        uint8[columns, days] what each value is (the VALUE_* constants)
+    #   values       float64[columns, days] the number, or a string table index
+    #   plot         float64[columns, days] what the value plots as, NaN if nothing
+    #
+    # The header holds the string table (names, types, string values) and each distinct
+    # layout once, with the column each of its items' values is kept in. A column belongs
+    # to one item id, so an item's whole history is one contiguous row of the arrays, which
+    # are memory-mapped rather than read. Everything read from them is copied out, so close
+    # can always unmap the file.
+    MAGIC = b'TGBSNAP1'
+    VALUE_ABSENT, VALUE_FLOAT, VALUE_INT, VALUE_FALSE, VALUE_TRUE, VALUE_NONE, VALUE_STRING, VALUE_JSON = range(8)
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError("Not a binary tracking snapshot: %s" % path)
+            header_length, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_length))
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.first_date = np.datetime64(header['first_date'], 'D')
+        self.strings = header['strings']
+        self.schemas = header['schemas']
+        self.columns = header['columns']  # [node id, occurrence on its day, latest graphable type]
+        self.column_of = {(node_id, occurrence): column
+                          for column, (node_id, occurrence, item_type) in enumerate(self.columns)}
+        day_count = header['day_count']
+        offset = align8(len(self.MAGIC) + 8 + header_length)
+        self.day_schemas, offset = map_array(self.map, np.int32, (day_count,), offset)
+        self.kinds, offset = map_array(self.map, np.uint8, (len(self.columns), day_count), offset)
+        self.values, offset = map_array(self.map, np.float64, (len(self.columns), day_count), offset)
+        self.plot, offset = map_array(self.map, np.float64, (len(self.columns), day_count), offset)
+
+    def close(self):
+        # The arrays are views of the map and have to go first. Windows can't replace or
+        # delete a file while it is mapped.
+        self.day_schemas = self.kinds = self.values = self.plot = None
+        self.map.close()
+
+    def dates(self):
+        offsets = np.flatnonzero(self.day_schemas >= 0)
+        return [str(day) for day in self.first_date + offsets]
+
+    def day(self, date):
+        offset = int((np.datetime64(date, 'D') - self.first_date).astype(np.int64))
+        schema = self.schemas[int(self.day_schemas[offset])]
+        # One gather per array for the whole day; tolist gives plain Python numbers to decode
+        kinds = self.kinds[schema['columns'], offset].tolist()
+        values = self.values[schema['columns'], offset].tolist()
+        return self.build_node(schema['layout'], map(self.decode_value, kinds, values))
+
+    def days(self):
+        for date in self.dates():
+            yield date, self.day(date)
+
+    def decode_value(self, kind, value):
+        if kind == self.VALUE_FLOAT:
+            return value
+        if kind == self.VALUE_INT:
+            return int(value)
+        if kind == self.VALUE_STRING:
+            return self.strings[int(value)]
+        if kind == self.VALUE_JSON:
+            return json.loads(self.strings[int(value)])
+        return {self.VALUE_FALSE: False, self.VALUE_TRUE: True}.get(kind)
+
+    def decode_field(self, value):
+        # Strings are string table indexes; anything else is kept as a one-element list
+        return self.strings[value] if isinstance(value, int) else value[0]
+
+    def build_node(self, layout, values):
+        node = {self.strings[key]: self.decode_field(value) for key, value in layout['fields']}
+        if 'folders' in layout:
+            node['folders'] = [self.build_node(folder, values) for folder in layout['folders']]
+        if 'items' in layout:
+            node['items'] = []
+            for item_layout in layout['items']:
+                item = {self.strings[key]: self.decode_field(value) for key, value in item_layout['fields']}
+                value = next(values)
+                if item_layout.get('value', True):
+                    item['value'] = value
+                node['items'].append(item)
+        return node
+
+    def series(self, node_ids):
+        # {node id: (type, dates, values)} of the points the given items plot as. Each is read
+        # from the item's mapped row; only the recorded points are copied out of it.
+        series = {}
+        for node_id in node_ids:
+            column = self.column_of.get((node_id, 0))
+            if column is None or self.columns[column][2] is None:
+                continue
+            row = self.plot[column]
+            offsets = np.flatnonzero(~np.isnan(row))
+            series[node_id] = (self.columns[column][2], self.first_date + offsets, row[offsets])
+        return series
+
+
+def align8(offset):
+    return (offset + 7) // 8 * 8
+
+
+def map_array(buffer, dtype, shape, offset):
+    # A read-only array over one part of a mapped binary snapshot, and where the next one starts
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if size == 0:
+        return np.zeros(shape, dtype=dtype), offset
+    array = np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+    return array, align8(offset + size)
+
+
+class BinarySnapshotWriter:
+    # Collects days one at a time and writes them in the format BinarySnapshot reads
+    def __init__(self):
+        self.strings = {}
+        self.schemas = {}  # (layout JSON, column keys) -> schema number
+        self.schema_list = []
+        self.columns = {}  # (node id, occurrence) -> column number
+        self.column_types = []
+        self.days = []  # (date, schema number, values, plot values)
+
+    def string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        return index
+
+    def encode_field(self, value):
+        return self.string(value) if isinstance(value, str) else [value]
+
+    def encode_node(self, node, items):
+        # Layout of node as the header stores it; (item, item fields) are appended to items
+        layout = {'fields': [[self.string(key), self.encode_field(value)] for key, value in node.items()
+                             if key not in ('folders', 'items')]}
+        if 'folders' in node:
+            layout['folders'] = [self.encode_node(folder, items) for folder in node['folders']]
+        if 'items' in node:
+            layout['items'] = []
+            for item in node['items']:
+                item_layout = {'fields': [[self.string(key), self.encode_field(value)]
+                                          for key, value in item.items() if key != 'value']}
+                if 'value' not in item:
+                    item_layout['value'] = False
+                layout['items'].append(item_layout)
+                items.append(item)
+        return layout
+
+    def add_day(self, date, day_data):
+        # Columns are per item id, so days saved before ids existed get theirs here, the
+        # same ones they get when they are loaded
+        assign_node_ids(day_data)
+        items = []
+        layout = self.encode_node(day_data, items)
+        occurrences = {}
+        keys = []
+        for item in items:
+            node_id = item.get('id')
+            keys.append((node_id, occurrences.get(node_id, 0)))
+            occurrences[node_id] = keys[-1][1] + 1
+        schema_key = (json.dumps(layout), tuple(keys))
+        schema = self.schemas.get(schema_key)
+        if schema is None:
+            schema = self.schemas[schema_key] = len(self.schema_list)
+            self.schema_list.append({'layout': layout, 'columns': [self.column(key) for key in keys]})
+        plot = []
+        for item, key in zip(items, keys):
+            item_type = item.get('type')
+            value = series_value(item_type, item.get('value')) if item_type in GRAPHABLE_TYPES else None
+            if value is not None and key[1] == 0:
+                self.column_types[self.columns[key]] = item_type
+            plot.append(np.nan if value is None else value)
+        self.days.append((date, schema, [item.get('value') for item in items], plot))
+
+    def column(self, key):
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = len(self.columns)
+            self.column_types.append(None)
+        return column
+
+    def encode_value(self, value):
+        if value is False or value is True:
+            return (BinarySnapshot.VALUE_TRUE if value else BinarySnapshot.VALUE_FALSE), 0.0
+        if value is None:
+            return BinarySnapshot.VALUE_NONE, 0.0
+        if isinstance(value, float):
+            return BinarySnapshot.VALUE_FLOAT, value
+        if isinstance(value, int) and abs(value) <= 2 ** 53:
+            # Exactly representable as a float64
+            return BinarySnapshot.VALUE_INT, float(value)
+        if isinstance(value, str):
+            return BinarySnapshot.VALUE_STRING, float(self.string(value))
+        return BinarySnapshot.VALUE_JSON, float(self.string(json.dumps(value)))
+
+    def write(self, f):
+        # The columns of a day are only known once every day has been added
+        day_numbers = [np.datetime64(date, 'D').astype(np.int64) for date, _, _, _ in self.days]
+        first_day = min(day_numbers) if day_numbers else 0
+        day_count = max(day_numbers) - first_day + 1 if day_numbers else 0
+        day_schemas = np.full(day_count, -1, dtype=np.int32)
+        kinds = np.zeros((len(self.columns), day_count), dtype=np.uint8)
+        values = np.zeros((len(self.columns), day_count), dtype=np.float64)
+        plot = np.full((len(self.columns), day_count), np.nan, dtype=np.float64)
+        for day_number, (date, schema, day_values, day_plot) in zip(day_numbers, self.days):
+            offset = day_number - first_day
+            day_schemas[offset] = schema
+            for column, value, plot_value in zip(self.schema_list[schema]['columns'], day_values, day_plot):
+                kinds[column, offset], values[column, offset] = self.encode_value(value)
+                plot[column, offset] = plot_value
+        header = json.dumps({
+            'first_date': str(np.datetime64(int(first_day), 'D')),
+            'day_count': int(day_count),
+            'strings': list(self.strings),
+            'schemas': self.schema_list,
+            'columns': [[node_id, occurrence, self.column_types[column]]
+                        for (node_id, occurrence), column in self.columns.items()],
+        }).encode('utf-8')
+        f.write(BinarySnapshot.MAGIC + struct.pack('<Q', len(header)) + header)
+        for array in (day_schemas, kinds, values, plot):
+            f.write(b'\0' * (align8(f.tell()) - f.tell()))
+            f.write(array.tobytes())
+
+
+class BinarySnapshotStorage(JournaledStorage):
+    # JournaledStorage with the snapshot in the binary format of BinarySnapshot (.tgb files).
+    # Names, types and layouts are stored once instead of on every day, and an item's
+    # history can be plotted straight from the memory-mapped snapshot. The journal and
+    # compaction work as for JSON; --convert-to switches a data file between the formats.
+    def __init__(self, path, compact_threshold=200, on_progress=None):
+        super().__init__(path, compact_threshold, on_progress)
+        self.snapshot = None
+
+    def open_snapshot(self):
+        if not os.path.exists(self.path):
+            storage_log.debug("No existing snapshot. Starting empty.")
+            self.snapshot = None
+            return
+        self.snapshot = BinarySnapshot(self.path)
+        storage_log.debug("Mapped binary snapshot with %s columns.", len(self.snapshot.columns))
+
+    def list_dates(self):
+        return self.snapshot.dates() if self.snapshot is not None else []
+
+    def load_days(self, dates):
+        # Under the lock so a compaction cannot swap the snapshot in the middle
+        with self.lock:
+            return {date: self.snapshot.day(date) for date in dates}
+
+    def read_snapshot(self):
+        # A separate mapping, so the copy doesn't hold the lock while it reads
+        if not os.path.exists(self.path):
+            return {}
+        snapshot = BinarySnapshot(self.path)
+        try:
+            return dict(snapshot.days())
+        finally:
+            snapshot.close()
+
+    def write_snapshot_lines(self, days):
+        writer = BinarySnapshotWriter()
+        for date, day_data in days:
+            writer.add_day(date, day_data)
+        with open(self.temp_path, 'wb') as f:
+            writer.write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        return None
+
+    def install_snapshot(self, offsets):
+        # The old file is unmapped before it is replaced, and lazy reads wait on the lock
+        with self.lock:
+            if self.snapshot is not None:
+                self.snapshot.close()
+                self.snapshot = None
+            os.replace(self.temp_path, self.path)
+            self.snapshot = BinarySnapshot(self.path)
+        storage_log.debug("Wrote snapshot to %s", self.path)
+
+    def snapshot_series(self, node_ids):
+        with self.lock:
+            return self.snapshot.series(node_ids) if self.snapshot is not None else {}
+
+    def close(self):
+        super().close()
+        with self.lock:
+            if self.snapshot is not None:
+                self.snapshot.close()
+                self.snapshot = None
+
+
+class SqliteStorage(StorageBackend):
+    # Normalized tables for dates, folders, items and values. Folders and items keep their
+    # ids, so a single item's history is one range scan over items(node_id, date_id).
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dates (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS folders (
+            id INTEGER PRIMARY KEY,
+            date_id INTEGER NOT NULL REFERENCES dates(id) ON DELETE CASCADE,
+            parent_id INTEGER REFERENCES folders(id) ON DELETE CASCADE,
+            path TEXT NOT NULL,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            node_id INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            date_id INTEGER NOT NULL REFERENCES dates(id) ON DELETE CASCADE,
+            folder_id INTEGER REFERENCES folders(id) ON DELETE CASCADE,
+            path TEXT NOT NULL,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            node_id INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS item_values (
+            item_id INTEGER PRIMARY KEY REFERENCES items(id) ON DELETE CASCADE,
+            value TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS folders_by_date ON folders(date_id, path);
+        CREATE INDEX IF NOT EXISTS items_by_date ON items(date_id, path);
+        DROP INDEX IF EXISTS values_by_item_date;
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(self.SCHEMA)
+        for table in ('folders', 'items'):
+            # Databases created before folders and items had ids; theirs are assigned on load
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(%s)" % table)]
+            if 'node_id' not in columns:
+                self.conn.execute("ALTER TABLE %s ADD COLUMN node_id INTEGER" % table)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_by_node ON items(node_id, date_id)")
+        if 'item_path' in [row[1] for row in self.conn.execute("PRAGMA table_info(item_values)")]:
+            # Older databases repeated each value's item path and date, which nothing reads
+            # and every folder move had to rewrite across the whole history
+            self.conn.executescript("""
+                BEGIN;
+                CREATE TABLE item_values_by_id (
+                    item_id INTEGER PRIMARY KEY REFERENCES items(id) ON DELETE CASCADE,
+                    value TEXT NOT NULL
+                );
+                INSERT INTO item_values_by_id SELECT item_id, value FROM item_values;
+                DROP TABLE item_values;
+                ALTER TABLE item_values_by_id RENAME TO item_values;
+                COMMIT;
+            """)
+            storage_log.debug("Dropped the item path and date columns from item_values.")
+        if self.conn.execute("SELECT 1 FROM items WHERE node_id IS NULL LIMIT 1").fetchone():
+            # Item series are looked up by id, so items stored without one get the id that
+            # assign_node_ids gives them on load, once
+            self.conn.create_function('node_id_for_path', 1, node_id_for_path, deterministic=True)
+            with self.conn:
+                self.conn.execute("UPDATE items SET node_id = node_id_for_path(path) WHERE node_id IS NULL")
+            storage_log.debug("Assigned ids to items stored without one.")
+        # Reentrant because append reads the source day of a copy_day while holding it
+        self.lock = threading.RLock()
+        storage_log.debug("Opened SQLite storage: %s", path)
+
+    def load(self):
+        data = LazyDateStore(self)
+        storage_log.debug("Found %s dates in SQLite.", len(data))
+        return data
+
+    def list_dates(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT date FROM dates")]
+
+    def load_day(self, date):
+        return self.read_days("WHERE d.date = ?", (date,)).get(date, {'folders': [], 'items': []})
+
+    def load_days(self, dates):
+        # Batches (see iter_days) are read with one query; for more dates than SQLite accepts
+        # as parameters, one pass over the tables is cheaper than a query per date
+        dates = list(dates)
+        if len(dates) <= 500:
+            placeholders = ", ".join("?" * len(dates))
+            return self.read_days("WHERE d.date IN (%s)" % placeholders, dates) if dates else {}
+        wanted = set(dates)
+        return {date: day for date, day in self.read_days("", ()).items() if date in wanted}
+
+    def read_days(self, where, params):
+        with self.lock:
+            data = {}
+            dates = {}
+            for date_id, date in self.conn.execute("SELECT d.id, d.date FROM dates d " + where, params):
+                data[date] = {'folders': [], 'items': []}
+                dates[date_id] = data[date]
+            # Parents are attached by id, so fetch everything first and link in position order
+            folders = {}
+            folder_rows = self.conn.execute(
+                "SELECT f.id, f.date_id, f.parent_id, f.name, f.node_id FROM folders f "
+                "JOIN dates d ON d.id = f.date_id " + where + " ORDER BY f.position", params).fetchall()
+            for folder_id, date_id, parent_id, name, node_id in folder_rows:
+                folders[folder_id] = {'name': name, 'folders': [], 'items': []}
+                if node_id is not None:
+                    folders[folder_id]['id'] = node_id
+            for folder_id, date_id, parent_id, name, node_id in folder_rows:
+                parent = folders[parent_id] if parent_id is not None else dates[date_id]
+                parent['folders'].append(folders[folder_id])
+            item_rows = self.conn.execute(
+                "SELECT i.date_id, i.folder_id, i.name, i.type, v.value, i.node_id FROM items i "
+                "JOIN item_values v ON v.item_id = i.id JOIN dates d ON d.id = i.date_id "
+                + where + " ORDER BY i.position", params)
+            for date_id, folder_id, name, item_type, value, node_id in item_rows:
+                parent = folders[folder_id] if folder_id is not None else dates[date_id]
+                item = {'name': name, 'type': item_type, 'value': json.loads(value)}
+                if node_id is not None:
+                    item['id'] = node_id
+                parent['items'].append(item)
+        return data
+
+    def append(self, change):
+        self.append_many([change])
+
+    def append_many(self, changes):
+        # One transaction for the whole batch
+        with self.lock, self.conn:
+            for change in changes:
+                self.apply_row_change(change)
+
+    def apply_row_change(self, change):
+        op = change['op']
+        if op == 'set_day':
+            self.write_day(change['date'], change['day'])
+            return
+        if op == 'copy_day':
+            day_data = self.read_days("WHERE d.date = ?", (change['source'],)).get(change['source'])
+            if day_data is not None:
+                if not change['values']:
+                    clear_values(day_data)
+                self.write_day(change['date'], day_data)
+            return
+        date_id = self.date_id(change['date'])
+        if op == 'add_folder':
+            folder_id, folder_path = self.resolve_folder(date_id, change['parent'])
+            path = join_path(folder_path, change['name'])
+            if self.find_row('folders', date_id, path) is None:
+                folder = {'name': change['name'], 'folders': [], 'items': []}
+                if 'id' in change:
+                    folder['id'] = change['id']
+                self.insert_folder(date_id, folder_id, folder_path, folder)
+        elif op == 'add_item':
+            folder_id, folder_path = self.resolve_folder(date_id, change['parent'])
+            path = join_path(folder_path, change['item']['name'])
+            if self.find_row('items', date_id, path) is None:
+                self.insert_item(date_id, folder_id, folder_path, change['item'])
+        elif op == 'set_value':
+            # A folder at the same path shadows the item, as in resolve_node
+            item_id = None
+            if self.find_row('folders', date_id, change['path']) is None:
+                item_id = self.find_row('items', date_id, change['path'])
+            if item_id is not None:
+                self.conn.execute("UPDATE item_values SET value = ? WHERE item_id = ?",
+                                  (json.dumps(change['value']), item_id))
+        elif op == 'move':
+            self.move_row(date_id, change)
+        else:
+            raise ValueError("Unknown change op: %s" % op)
+
+    def move_row(self, date_id, change):
+        # Same splice as apply_change: close the gap in the old parent's positions, open one at
+        # index in the new parent, then rewrite the paths of the row and everything under it
+        old_path = change['path']
+        if not old_path or change['parent'] == old_path or change['parent'].startswith(old_path + '/'):
+            return
+        destination_id = None
+        if change['parent']:
+            destination_id = self.find_row('folders', date_id, change['parent'])
+            if destination_id is None:
+                return
+        table, parent_column = 'folders', 'parent_id'
+        row_id = self.find_row('folders', date_id, old_path)
+        if row_id is None:
+            table, parent_column = 'items', 'folder_id'
+            row_id = self.find_row('items', date_id, old_path)
+            if row_id is None:
+                return
+        new_path = join_path(change['parent'], old_path.rpartition('/')[2])
+        if new_path != old_path and (self.find_row('folders', date_id, new_path) is not None
+                                     or self.find_row('items', date_id, new_path) is not None):
+            # The destination already has a child with this name
+            return
+        parent_id, position = self.conn.execute(
+            "SELECT %s, position FROM %s WHERE id = ?" % (parent_column, table), (row_id,)).fetchone()
+        self.conn.execute("UPDATE %s SET position = position - 1 WHERE date_id = ? AND %s IS ? AND position > ?"
+                          % (table, parent_column), (date_id, parent_id, position))
+        count = self.conn.execute("SELECT COUNT(*) FROM %s WHERE date_id = ? AND %s IS ? AND id != ?"
+                                  % (table, parent_column), (date_id, destination_id, row_id)).fetchone()[0]
+        index = min(change['index'], count)
+        self.conn.execute("UPDATE %s SET position = position + 1 WHERE date_id = ? AND %s IS ? AND position >= ? "
+                          "AND id != ?" % (table, parent_column), (date_id, destination_id, index, row_id))
+        self.conn.execute("UPDATE %s SET %s = ?, position = ? WHERE id = ?" % (table, parent_column),
+                          (destination_id, index, row_id))
+        # The row itself is renamed by id, since an item and a folder can share a path; rows
+        # under a moved folder get new_path followed by the rest of their old path
+        self.conn.execute("UPDATE %s SET path = ? WHERE id = ?" % table, (new_path, row_id))
+        if table == 'items':
+            return
+        renamed = (new_path + '/', len(old_path) + 2)
+        under = (len(old_path) + 1, old_path + '/')
+        for table in ('folders', 'items'):
+            self.conn.execute("UPDATE %s SET path = ? || substr(path, ?) WHERE date_id = ? AND substr(path, 1, ?) = ?"
+                              % table, renamed + (date_id,) + under)
+
+    def snapshot_series(self, node_ids):
+        # One range scan of items_by_node per item. An item stored twice on one day counts once
+        # there, and its type is the one of its latest graphable day.
+        node_ids = list(node_ids)
+        rows = []
+        with self.lock:
+            for start in range(0, len(node_ids), 500):
+                batch = node_ids[start:start + 500]
+                rows += self.conn.execute(
+                    "SELECT i.node_id, d.date, i.type, v.value FROM items i JOIN dates d ON d.id = i.date_id "
+                    "JOIN item_values v ON v.item_id = i.id WHERE i.node_id IN (%s) ORDER BY i.node_id, d.date, i.id"
+                    % ", ".join("?" * len(batch)), batch).fetchall()
+        points = {}
+        for node_id, date, item_type, value in rows:
+            if item_type not in GRAPHABLE_TYPES:
+                continue
+            value = series_value(item_type, json.loads(value))
+            if value is None:
+                continue
+            _, dates, values = points.get(node_id, (None, [], []))
+            if dates and dates[-1] == date:
+                continue
+            dates.append(date)
+            values.append(value)
+            points[node_id] = (item_type, dates, values)
+        return {node_id: (item_type, np.array(dates, dtype='datetime64[D]'), np.array(values, dtype=np.float64))
+                for node_id, (item_type, dates, values) in points.items()}
+
+    def import_data(self, data):
+        with self.lock, self.conn:
+            for date in sorted(data):
+                self.write_day(date, data[date])
+        storage_log.debug("Imported %s dates into SQLite.", len(data))
+
+    def write_day(self, date, day_data):
+        # Deleting the date cascades to its folders, items and values
+        self.conn.execute("DELETE FROM dates WHERE date = ?", (date,))
+        date_id = self.date_id(date)
+        self.insert_children(date_id, None, '', day_data)
+
+    def insert_children(self, date_id, folder_id, folder_path, node):
+        for folder in node.get('folders', []):
+            self.insert_folder(date_id, folder_id, folder_path, folder)
+        for item in node.get('items', []):
+            self.insert_item(date_id, folder_id, folder_path, item)
+
+    def insert_folder(self, date_id, parent_id, parent_path, folder):
+        path = join_path(parent_path, folder['name'])
+        cursor = self.conn.execute(
+            "INSERT INTO folders (date_id, parent_id, path, name, position, node_id) VALUES (?, ?, ?, ?, ?, ?)",
+            (date_id, parent_id, path, folder['name'], self.next_position('folders', date_id, parent_id),
+             folder.get('id', node_id_for_path(path))))
+        self.insert_children(date_id, cursor.lastrowid, path, folder)
+
+    def insert_item(self, date_id, folder_id, folder_path, item):
+        path = join_path(folder_path, item['name'])
+        cursor = self.conn.execute(
+            "INSERT INTO items (date_id, folder_id, path, name, type, position, node_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (date_id, folder_id, path, item['name'], item['type'],
+             self.next_position('items', date_id, folder_id), item.get('id', node_id_for_path(path))))
+        self.conn.execute("INSERT INTO item_values (item_id, value) VALUES (?, ?)",
+                          (cursor.lastrowid, json.dumps(item['value'])))
+
+    def next_position(self, table, date_id, parent_id):
+        parent_column = 'parent_id' if table == 'folders' else 'folder_id'
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM %s WHERE date_id = ? AND %s IS ?" % (table, parent_column),
+            (date_id, parent_id)).fetchone()
+        return row[0]
+
+    def date_id(self, date):
+        self.conn.execute("INSERT OR IGNORE INTO dates (date) VALUES (?)", (date,))
+        return self.conn.execute("SELECT id FROM dates WHERE date = ?", (date,)).fetchone()[0]
+
+    def find_row(self, table, date_id, path):
+        # Of rows sharing a path (only in data saved before moves checked for that), the first
+        # in position order, as resolve_node finds in the dict
+        row = self.conn.execute("SELECT id FROM %s WHERE date_id = ? AND path = ? ORDER BY position LIMIT 1"
+                                % table, (date_id, path)).fetchone()
+        return row[0] if row else None
+
+    def resolve_folder(self, date_id, path):
+        # Same rule as resolve_folder on the dict: the deepest existing folder along the path
+        folder_id, folder_path = None, ''
+        for key in path.split('/') if path else []:
+            child_path = join_path(folder_path, key)
+            child_id = self.find_row('folders', date_id, child_path)
+            if child_id is None:
+                break
+            folder_id, folder_path = child_id, child_path
+        return folder_id, folder_path
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+        storage_log.debug("Closed SQLite storage.")
+
+
+def open_storage(path, on_progress=None):
+    # The file extension picks the backend. on_progress is passed to the snapshot backends
+    # (see JournaledStorage); SQLite never reads a whole file at once.
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteStorage(path)
+    if extension == '.tgb':
+        return BinarySnapshotStorage(path, on_progress=on_progress)
+    return JournaledStorage(path, on_progress=on_progress)
+
+
+def print_progress(percent, path, megabytes):
+    # Progress of a big file read from the command line, where there is no window to show it
+    print("Read %s%% of %s (%s MB)" % (percent, path, megabytes), flush=True)
+
+
+def migrate_json_to_sqlite(json_path, sqlite_path, on_progress=None):
+    log.debug("Migrating %s to %s", json_path, sqlite_path)
+    source = JournaledStorage(json_path, on_progress=on_progress)
+    data = source.load()
+    data.load_all()
+    source.close()
+    target = SqliteStorage(sqlite_path)
+    target.import_data(data)
+    target.close()
+    log.debug("Migration complete.")
+
+
+def convert_storage(source_path, target_path, on_progress=None):
+    # Copies every day into a new data file in the format target_path's extension selects.
+    # Every folder and item is given its id first, as the app does on load, so converting
+    # one format to another and back gives the same data as the app loads.
+    log.debug("Converting %s to %s", source_path, target_path)
+    source = open_storage(source_path, on_progress)
+    if isinstance(source, JournaledStorage):
+        source.load()
+        data = source.read_snapshot()
+        for day_data in data.values():
+            assign_node_ids(day_data)
+        source.replay(source.journal_path, data)
+    else:
+        store = source.load()
+        store.load_all()
+        data = {date: store[date] for date in store}
+    source.close()
+    target = open_storage(target_path)
+    if isinstance(target, JournaledStorage):
+        target.write_snapshot(data)
+    else:
+        target.import_data(data)
+    target.close()
+    log.debug("Converted %s dates.", len(data))
+
+
+def coalesce_changes(changes):
+    # Drop records a later record in the batch makes redundant: anything for a date that is
+    # later replaced wholesale (set_day/copy_day), and earlier set_values of the same item.
+    # A copy_day reads its source date, so the source's earlier records are always kept.
+    kept = []
+    replaced_dates = set()
+    replaced_values = set()
+    for change in reversed(changes):
+        op = change['op']
+        date = change['date']
+        if date in replaced_dates:
+            continue
+        if op == 'set_value':
+            if (date, change['path']) in replaced_values:
+                continue
+            replaced_values.add((date, change['path']))
+        elif op in ('set_day', 'copy_day'):
+            replaced_dates.add(date)
+        else:
+            # Structural changes can make the same path mean a different item
+            replaced_values = {key for key in replaced_values if key[0] != date}
+        if op == 'copy_day':
+            replaced_dates.discard(change['source'])
+            replaced_values = {key for key in replaced_values if key[0] != change['source']}
+        kept.append(change)
+    kept.reverse()
+    return kept
+
+
+class SaveWorker:
+    # Writes change records to storage on a background thread so the Tk mainloop never waits
+    # on disk I/O. Changes queue up and are written together once edits have been quiet for
+    # quiet_period seconds, or after max_delay seconds while edits keep coming. Records are
+    # never modified after they are submitted (apply_change copies out of them), so the
+    # worker can hold them without locking.
+    FLUSH = 'flush'
+    STOP = 'stop'
+
+    def __init__(self, storage, quiet_period=1.0, max_delay=10.0):
+        self.storage = storage
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, change):
+        self.queue.put(change)
+
+    def flush(self):
+        self.queue.put(self.FLUSH)
+
+    def close(self):
+        # Writes whatever is still pending before returning
+        self.queue.put(self.STOP)
+        self.thread.join()
+
+    def run(self):
+        pending = []
+        first_pending_at = None
+        while True:
+            timeout = None
+            if pending:
+                time_left = first_pending_at + self.max_delay - time.monotonic()
+                timeout = max(0, min(self.quiet_period, time_left))
+            try:
+                message = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                message = self.FLUSH
+            if message == self.FLUSH or message == self.STOP:
+                if pending:
+                    pending = self.write(pending)
+                    first_pending_at = time.monotonic() if pending else None
+                if message == self.STOP:
+                    return
+                continue
+            if not pending:
+                first_pending_at = time.monotonic()
+            pending.append(message)
+
+    def write(self, pending):
+        changes = coalesce_changes(pending)
+        try:
+            with perf_stats.timed('save_data'):
+                self.storage.append_many(changes)
+        except Exception as error:
+            # Keep them for the next flush rather than losing edits
+            storage_log.warning("Saving failed, will retry: %s", error)
+            return changes
+        storage_log.debug("Saved %s changes (coalesced from %s).", len(changes), len(pending))
+        return []
+
+
+class TrackerCore:
+    # The tracking data and everything derived from it, with no Tk involved. Every public
+    # method takes the core's lock, so the Tk thread and worker threads can call any of them;
+    # callers that walk a returned day dict over several calls hold core.lock around the walk.
+    #
+    #   Edits: add_folder, add_item, set_value, copy_day and move apply one change record,
+    #   queue it for saving and return it (None when nothing changed). on_change, if given, is
+    #   then called with (change, catalog_ids, changed_ids) on the thread that made it: the
+    #   ids whose catalog entries and whose series changed.
+    #   Reads: has_date, day, get, catalog_tree, catalog_entry, graph_points, data_size.
+    #   History: missing_dates, read_days and add_loaded load the rest of the history from
+    #   a background thread.
+    #
+    # on_progress is passed to the storage, which reports reading a big file with it.
+    def __init__(self, data_file, save_delay=1.0, on_change=None, on_progress=None):
+        self.lock = threading.RLock()
+        self.data_file = data_file
+        self.on_change = on_change
+        self.storage = open_storage(data_file, on_progress)
+        self.save_worker = SaveWorker(self.storage, quiet_period=save_delay)
+        self.load()
+        self.path_indexes = {}  # date -> PathIndex of that day's data
+        self.series_index = SeriesIndex()  # Filled in as items are plotted
+        self.item_catalog = None  # Built by build_catalog when the Graphs tab is first opened
+        # Points ready to plot, dropped when their item changes
+        self.graph_points_cache = GraphCache(max_entries=128)
+
+    @timed_method('load_data')
+    def load(self):
+        storage_log.debug("Loading data from file.")
+        self.data = self.storage.load()
+        storage_log.debug("Data loaded.")
+
+    def close(self):
+        # Writes anything still waiting for the quiet period
+        self.save_worker.close()
+        self.storage.close()
+
+    def set_save_delay(self, seconds):
+        self.save_worker.quiet_period = seconds
+
+    def has_date(self, date):
+        with self.lock:
+            return date in self.data
+
+    def day(self, date):
+        # The nested dict of a date, or None. It is only current until the lock is released.
+        with self.lock:
+            return self.data[date] if date in self.data else None
+
+    def get(self, date, path):
+        with self.lock:
+            return self.day_index(date).get(path)
+
+    def data_size(self):
+        with self.lock:
+            return {
+                'dates': len(self.data),
+                'loaded_dates': len(self.data.days),
+                'schema_versions': len(self.data.schemas),
+            }
+
+    def day_index(self, date):
+        # The PathIndex for a day, rebuilt if the day's dict was replaced (set_day) or
+        # re-expanded by the data store since it was built
+        day_data = self.data[date]
+        index = self.path_indexes.get(date)
+        if index is None or index.day_data is not day_data:
+            index = self.path_indexes[date] = PathIndex(day_data)
+            tracking_log.debug("Indexed %s paths for %s.", len(index.nodes), date)
+            # An index keeps its day's dict alive, so the ones of days the data store has
+            # folded back into compact form are dropped; they'd be rebuilt on the next access
+            for old_date in [old_date for old_date in self.path_indexes if old_date not in self.data.expanded]:
+                del self.path_indexes[old_date]
+        return index
+
+    def apply(self, change):
+        apply_change(self.data, change)
+        catalog_ids = self.item_catalog.update(change, self.data) if self.item_catalog is not None else set()
+        changed_ids = self.series_index.update(change, self.data)
+        if changed_ids:
+            self.graph_points_cache.invalidate(changed_ids)
+        self.save_worker.submit(change)
+        storage_log.debug("Queued change for saving: %s", change['op'])
+        if self.on_change is not None:
+            self.on_change(change, catalog_ids, changed_ids)
+        return change
+
+    def new_node_id(self, date, parent_path, name):
+        # Taken from the path the node is created at, so items added separately at the same
+        # path on different days share a history. If that id is already used on this day (a
+        # node created there was moved away), a random one is used instead.
+        day_index = self.day_index(date)
+        node_id = node_id_for_path(join_path(day_index.folder_path(parent_path), name))
+        while node_id in day_index.ids:
+            node_id = random.getrandbits(48)
+        return node_id
+
+    def index_added_node(self, date, parent_path, kind):
+        # add_folder/add_item append to the parent folder's list, so the new node is its last entry
+        day_index = self.day_index(date)
+        folder_path = day_index.folder_path(parent_path)
+        day_index.add(folder_path, day_index.get(folder_path)[kind][-1])
+
+    def add_folder(self, date, parent_path, name):
+        with self.lock:
+            if date not in self.data:
+                self.data[date] = {'folders': [], 'items': []}
+            change = {
+                'op': 'add_folder',
+                'date': date,
+                'parent': parent_path,
+                'name': name,
+                'id': self.new_node_id(date, parent_path, name)
+            }
+            self.apply(change)
+            self.index_added_node(date, parent_path, 'folders')
+            tracking_log.debug("Added folder: %s", name)
+            return change
+
+    def add_item(self, date, parent_path, name, item_type):
+        with self.lock:
+            if date not in self.data:
+                self.data[date] = {'folders': [], 'items': []}
+            new_item = {
+                'name': name,
+                'type': item_type,
+                'value': default_value(item_type),
+                'id': self.new_node_id(date, parent_path, name)
+            }
+            change = {
+                'op': 'add_item',
+                'date': date,
+                'parent': parent_path,
+                'item': new_item
+            }
+            self.apply(change)
+            self.index_added_node(date, parent_path, 'items')
+            tracking_log.debug("Added item: %s", name)
+            return change
+
+    def set_value(self, date, path, value):
+        with self.lock:
+            change = self.apply({'op': 'set_value', 'date': date, 'path': path, 'value': value})
+            tracking_log.debug("Set value of %s to %s", path, value)
+            return change
+
+    def copy_day(self, date, source, values):
+        # A copy of source with or without its values; None if there is no source day
+        with self.lock:
+            if source not in self.data:
+                return None
+            # The new day shares the source's schema version and gets its own value tuple
+            return self.apply({'op': 'copy_day', 'date': date, 'source': source, 'values': values})
+
+    def move(self, date, path, parent_path, index):
+        # Moves the node at path into the folder at parent_path, at index among that folder's
+        # folders or items. Returns None if that is where it already is, or if the move isn't
+        # possible (see move_applies).
+        with self.lock:
+            day_index = self.day_index(date)
+            node = day_index.get(path)
+            source = day_index.get(path.rpartition('/')[0])
+            destination = day_index.get(parent_path)
+            if not move_applies(path, parent_path, source, node, destination):
+                tracking_log.debug("Can't move %s to %s.", path, parent_path or 'root')
+                return None
+            kind = 'items' if 'type' in node else 'folders'
+            if source is destination and source[kind][min(index, len(source[kind]) - 1)] is node:
+                tracking_log.debug("Drop left %s where it was.", path)
+                return None
+            change = self.apply({'op': 'move', 'date': date, 'path': path, 'parent': parent_path, 'index': index})
+            names = [child['name'] for child in source.get('folders', []) + source.get('items', [])]
+            if source is not destination:
+                names += [child['name'] for child in destination.get('folders', []) + destination.get('items', [])]
+            if names.count(node['name']) > 1:
+                # Duplicate names resolve to the first match, which the move may have changed
+                self.path_indexes[date] = PathIndex(self.data[date])
+            else:
+                day_index.move(path, parent_path, node)
+            tracking_log.debug("Moved %s to %s at index %s.", path, parent_path or 'root', index)
+            return change
+
+    def build_catalog(self):
+        # Catalogs the days already in memory; the rest are added by add_loaded as they are read
+        with self.lock:
+            if self.item_catalog is None:
+                self.item_catalog = ItemCatalog()
+                for date in self.data:
+                    if self.data.is_loaded(date):
+                        self.item_catalog.update_day(date, self.data)
+
+    def catalog_tree(self):
+        with self.lock:
+            return self.item_catalog.tree()
+
+    def catalog_entry(self, node_id):
+        # The CatalogEntry of an item, or None if it is no longer catalogued
+        with self.lock:
+            return self.item_catalog.entries.get(node_id)
+
+    def missing_dates(self):
+        with self.lock:
+            return self.data.missing_dates()
+
+    def read_days(self, dates):
+        # (date, day) pairs straight from storage, a batch at a time; doesn't take the lock
+        return self.storage.iter_days(dates)
+
+    def add_loaded(self, date, day_data):
+        with self.lock:
+            if self.data.add_loaded(date, day_data) and self.item_catalog is not None:
+                self.item_catalog.update_day(date, self.data)
+
+    def load_series(self, node_ids):
+        # Reads the history of every item not indexed yet in one pass
+        with self.lock:
+            self.series_index.load(node_ids, self.data)
+
+    def graph_points(self, node_id, mode, max_points):
+        # (dates, values, bar_days) ready to draw, or None if the item has nothing to plot.
+        # Booleans are already 0/1 in the index.
+        cache_key = (node_id, mode, max_points)
+        with self.lock:
+            points = self.graph_points_cache.get(cache_key)
+            if points is not None:
+                return points
+            self.series_index.load([node_id], self.data)
+            series = self.series_index.series(node_id)
+            if series is None:
+                return None
+            if mode not in aggregations_for([self.series_index.columns[node_id].item_type]):
+                graphs_log.debug("Item %s can't be shown as %s.", node_id, mode)
+                return None
+            dates, values = aggregate_series(series[0], series[1], mode)
+            bar_days = AGGREGATIONS[mode]
+            # Never draw more points than the canvas has room for
+            if len(values) > max_points:
+                bar_days = max(bar_days, int((dates[-1] - dates[0]).astype(np.int64)) / max_points)
+                dates, values = downsample_series(dates, values, max_points)
+            # Whatever is still a view of the live column is copied, so the points can be
+            # handed to another thread and kept while the column changes
+            if np.may_share_memory(dates, series[0]):
+                dates = dates.copy()
+            if np.may_share_memory(values, series[1]):
+                values = values.copy()
+            graphs_log.debug("Item %s: %s values (%s, %s recorded).", node_id, len(values), mode, len(series[1]))
+            points = (dates, values, bar_days)
+            self.graph_points_cache.put(cache_key, points)
+            return points
 
 
 class DailyTrackingApp:
-    def __init__(self, root):
-        print("Initializing the Daily Tracking App.")
+    def __init__(self, root, data_file="tracking_data.json"):
+        log.debug("Initializing the Daily Tracking App.")
         self.root = root
         self.root.title("Daily Tracking App")
-        print("Set the window title.")
+        log.debug("Set the window title.")
 
-        self.data_file = "tracking_data.json"
-        self.load_data()
-        print("Loaded data from file.")
+        self.data_file = data_file
+        self.settings_file = data_file + '.settings.json'
+        self.save_delay = 1.0  # Seconds without edits before pending changes are written
+        self.ui_scale = 1.0
+        self.ui_padding = 5
+        # Virtualized trees only create rows for the children of expanded folders
+        self.virtualize_trees = False
+        self.load_settings()
+        self.load_status = None  # Shown while a big data file is read, before the tabs exist
+        self.core = TrackerCore(data_file, self.save_delay, on_change=self.on_data_changed,
+                                on_progress=self.show_load_progress)
+        if self.load_status is not None:
+            self.load_status.destroy()
+            self.load_status = None
+        log.debug("Loaded data from file.")
 
         self.current_date = datetime.now().strftime("%Y-%m-%d")
-        print("Set current date to today:", self.current_date)
+        log.debug("Set current date to today: %s", self.current_date)
+
+        self.open_folder_paths = set()
+        self.padded_widgets = []  # (widget, padx, pady) packed with the UI padding, see pack_padded
+        self.base_font_sizes = None  # Pixel sizes of the named fonts at scale 1, once scaled
+
+        self.tree_item_paths = {}  # Dictionary to store item paths
+        self.tree_item_values = {}  # Value last shown for each item, to skip unchanged cells
+        self.graph_tree_item_ids = {}  # Graph tree row -> item id
+        self.graph_tree_item_rows = {}  # Item id -> (graph tree row, path it is shown at)
+        # Graph tree folder row -> path and back; virtual folders insert their contents on expand
+        self.graph_tree_folders = {}
+        self.graph_tree_folder_rows = {}
+        # Rendered graph backgrounds, dropped when their item changes
+        self.graph_image_cache = GraphCache(max_entries=16)
+        self.history_thread = None  # Reads the rest of the history once the Graphs tab is opened
+        self.history_stop = threading.Event()
+        # Graph points are computed off the Tk thread; only the latest request is drawn
+        self.graph_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='graph')
+        self.graph_future = None
+        self.graph_request_id = 0
+        self.graph_request_started = None
 
         # Check if current date data exists, if not, copy previous day's items without data
-        if self.current_date not in self.data:
-            print("Current date data not found. Copying items from previous day.")
+        if not self.core.has_date(self.current_date):
+            log.debug("Current date data not found. Copying items from previous day.")
             self.copy_previous_items_only()
 
-        self.ui_scale = 1.0
-        self.ui_padding = 5
-
-        self.tree_item_paths = {}  # Dictionary to store item paths
+        if self.ui_scale != 1.0:
+            self.apply_ui_scale()
         self.create_widgets()
-        print("Created the widgets.")
-
-    def load_data(self):
-        print("Loading data from file.")
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r') as f:
-                self.data = json.load(f)
-                print("Data loaded.")
-        else:
-            self.data = {}
-            print("No existing data file. Initialized empty data.")
-
-    def save_data(self):
-        print("Saving data to file.")
-        with open(self.data_file, 'w') as f:
-            json.dump(self.data, f)
-            print("Data saved.")
+        log.debug("Created the widgets.")
 
     def create_widgets(self):
-        print("Creating widgets.")
+        log.debug("Creating widgets.")
         self.notebook = ttk.Notebook(self.root)
-        self.notebook.pack(expand=1, fill='both', padx=self.ui_padding, pady=self.ui_padding)
-        print("Created notebook.")
+        self.pack_padded(self.notebook, expand=1, fill='both')
+        log.debug("Created notebook.")
 
         # Create Tracking tab
         self.tracking_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.tracking_frame, text='Tracking')
-        print("Created tracking tab.")
+        log.debug("Created tracking tab.")
 
         # Create Graphs tab
         self.graphs_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.graphs_frame, text='Graphs')
-        print("Created graphs tab.")
+        log.debug("Created graphs tab.")
 
         # Create Settings tab
         self.settings_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.settings_frame, text='Settings')
-        print("Created settings tab.")
+        log.debug("Created settings tab.")
 
         self.create_tracking_tab()
-        print("Initialized tracking tab content.")
+        log.debug("Initialized tracking tab content.")
 
-        self.create_graphs_tab()
-        print("Initialized graphs tab content.")
+        # The Graphs tab content and matplotlib wait until the tab is first selected
+        self.graphs_tab_created = False
 
         self.create_settings_tab()
-        print("Initialized settings tab content.")
+        log.debug("Initialized settings tab content.")
+
+        # History beyond the viewed days is only loaded once the Graphs tab is opened
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        log.debug("Bound notebook tab change event.")
+
+    def show_load_progress(self, percent, path, megabytes):
+        # Converting a big legacy file blocks before the window has anything else to show
+        if self.load_status is None:
+            self.load_status = ttk.Label(self.root)
+            self.load_status.pack(padx=20, pady=20)
+        self.load_status.config(text=f"Reading {os.path.basename(path)} ({megabytes} MB): {percent}%")
+        self.root.update()
+
+    def on_tab_changed(self, event):
+        if self.notebook.select() == str(self.graphs_frame) and not self.graphs_tab_created:
+            graphs_log.debug("Graphs tab opened for the first time.")
+            import_matplotlib()
+            self.create_graphs_tab()
+            self.graphs_tab_created = True
+            # Catalog the days already in memory now and the rest as they are read
+            self.core.build_catalog()
+            if self.history_thread is None:
+                self.start_history_load()
+            self.populate_graph_tree()
+            graphs_log.debug("Populated graph Treeview.")
+
+    def start_history_load(self):
+        # Days not loaded yet are read and added to the data and the catalog on a background
+        # thread; the Tk thread only shows the progress and redraws the item list at the end
+        dates = self.core.missing_dates()
+        if not dates:
+            return
+        self.history_total = len(dates)
+        self.history_loaded = 0
+        self.history_thread = threading.Thread(target=self.read_history, args=(dates,), daemon=True)
+        self.history_thread.start()
+        graphs_log.debug("Loading %s dates in the background.", len(dates))
+        self.root.after(100, self.poll_history_load)
+
+    def read_history(self, dates):
+        for date, day_data in self.core.read_days(dates):
+            if self.history_stop.is_set():
+                break
+            self.core.add_loaded(date, day_data)
+            self.history_loaded += 1
+
+    def poll_history_load(self):
+        if self.history_thread.is_alive():
+            self.history_status.config(text=f"Loading history: {self.history_loaded} of {self.history_total} days")
+            self.root.after(100, self.poll_history_load)
+            return
+        graphs_log.debug("Finished loading history.")
+        self.history_status.config(text="")
+        self.populate_graph_tree()
 
     def create_tracking_tab(self):
-        print("Creating tracking tab content.")
+        tracking_log.debug("Creating tracking tab content.")
         # Date navigation frame
         self.date_nav_frame = ttk.Frame(self.tracking_frame)
         self.date_nav_frame.pack()
-        print("Created date navigation frame.")
+        tracking_log.debug("Created date navigation frame.")
 
         # Previous Day Button
         self.prev_day_button = ttk.Button(self.date_nav_frame, text="< Previous Day", command=self.go_to_previous_day)
         self.prev_day_button.pack(side='left')
-        print("Created 'Previous Day' button.")
+        tracking_log.debug("Created 'Previous Day' button.")
 
         # Next Day Button
         self.next_day_button = ttk.Button(self.date_nav_frame, text="Next Day >", command=self.go_to_next_day)
         self.next_day_button.pack(side='left')
-        print("Created 'Next Day' button.")
+        tracking_log.debug("Created 'Next Day' button.")
 
         # Display current date
         self.date_label = ttk.Label(self.tracking_frame, text="Date: " + self.current_date)
         self.date_label.pack()
-        print("Displayed current date:", self.current_date)
+        tracking_log.debug("Displayed current date: %s", self.current_date)
 
         # Buttons
         self.button_frame = ttk.Frame(self.tracking_frame)
         self.button_frame.pack()
-        print("Created button frame.")
+        tracking_log.debug("Created button frame.")
 
         self.add_folder_button = ttk.Button(self.button_frame, text="Add Folder", command=self.add_folder)
-        self.add_folder_button.pack(side='left', padx=self.ui_padding, pady=self.ui_padding)
-        print("Created 'Add Folder' button.")
+        self.pack_padded(self.add_folder_button, side='left')
+        tracking_log.debug("Created 'Add Folder' button.")
 
         self.add_item_button = ttk.Button(self.button_frame, text="Add Item", command=self.add_item)
-        self.add_item_button.pack(side='left', padx=self.ui_padding, pady=self.ui_padding)
-        print("Created 'Add Item' button.")
+        self.pack_padded(self.add_item_button, side='left')
+        tracking_log.debug("Created 'Add Item' button.")
 
         self.copy_previous_button = ttk.Button(self.button_frame, text="Copy Previous", command=self.copy_previous)
-        self.copy_previous_button.pack(side='left', padx=self.ui_padding, pady=self.ui_padding)
-        print("Created 'Copy Previous' button.")
+        self.pack_padded(self.copy_previous_button, side='left')
+        tracking_log.debug("Created 'Copy Previous' button.")
 
         self.items_frame = ttk.Frame(self.tracking_frame)
         self.items_frame.pack(fill='both', expand=True)
-        print("Created items frame.")
+        tracking_log.debug("Created items frame.")
 
         # Create Treeview for items
         self.tree = ttk.Treeview(self.items_frame)
         self.tree.pack(fill='both', expand=True)
-        print("Created Treeview for items.")
+        tracking_log.debug("Created Treeview for items.")
 
         # Configure Treeview columns
         self.tree['columns'] = ('Value',)
         self.tree.heading('#0', text='Item')
         self.tree.heading('Value', text='Value')
-        print("Configured Treeview columns.")
+        tracking_log.debug("Configured Treeview columns.")
 
         # Bind Treeview events for drag and drop
         self.tree.bind('<ButtonPress-1>', self.on_tree_item_press)
         self.tree.bind('<B1-Motion>', self.on_tree_item_motion)
         self.tree.bind('<ButtonRelease-1>', self.on_tree_item_release)
-        print("Bound Treeview events for drag and drop.")
+        tracking_log.debug("Bound Treeview events for drag and drop.")
+
+        self.tree.bind('<<TreeviewOpen>>', self.on_tree_folder_open)
+        self.tree.bind('<<TreeviewClose>>', self.on_tree_folder_close)
+        tracking_log.debug("Bound Treeview events for expanding and collapsing folders.")
 
         # Load items for the current date
         self.load_items()
-        print("Loaded items for the current date.")
+        tracking_log.debug("Loaded items for the current date.")
 
     def on_tree_item_press(self, event):
         item_id = self.tree.identify_row(event.y)
         if item_id:
             self.dragged_item = item_id
             self.dragged_item_parent = self.tree.parent(item_id)
-            print("Dragging item:", self.tree.item(item_id)['text'])
+            tracking_log.debug("Dragging item: %s", self.tree.item(item_id)['text'])
         else:
             self.dragged_item = None
 
@@ -163,91 +2506,131 @@ class DailyTrackingApp:
         moveto_item = self.tree.identify_row(event.y)
         if moveto_item and moveto_item != self.dragged_item:
             self.tree.move(self.dragged_item, self.tree.parent(moveto_item), self.tree.index(moveto_item))
-            print("Moved item during drag.")
+            tracking_log.debug("Moved item during drag.")
         elif not moveto_item:
             # Move to root
             self.tree.move(self.dragged_item, '', 'end')
-            print("Moved item to root during drag.")
+            tracking_log.debug("Moved item to root during drag.")
 
     def on_tree_item_release(self, event):
-        print("Treeview item released.")
+        tracking_log.debug("Treeview item released.")
         if not self.dragged_item:
             return
         target_item = self.tree.identify_row(event.y)
         if target_item and target_item != self.dragged_item:
-            print("Dropped on item:", self.tree.item(target_item)['text'])
+            tracking_log.debug("Dropped on item: %s", self.tree.item(target_item)['text'])
             # Check if target is a folder (has children or is marked as folder)
             if self.is_folder(target_item):
                 # Move item under the folder
                 self.tree.move(self.dragged_item, target_item, 'end')
-                print("Moved item into folder in Treeview.")
+                tracking_log.debug("Moved item into folder in Treeview.")
             else:
                 # Reorder item in the same parent
                 self.tree.move(self.dragged_item, self.tree.parent(target_item), self.tree.index(target_item))
-                print("Reordered item in Treeview.")
-            self.update_data_order()
-            self.save_data()
+                tracking_log.debug("Reordered item in Treeview.")
+            self.update_data_order(self.dragged_item)
         elif not target_item:
             # Moved to root
             self.tree.move(self.dragged_item, '', 'end')
-            print("Moved item to root in Treeview.")
-            self.update_data_order()
-            self.save_data()
+            tracking_log.debug("Moved item to root in Treeview.")
+            self.update_data_order(self.dragged_item)
         else:
-            print("Dropped on same item or invalid target.")
+            tracking_log.debug("Dropped on same item or invalid target.")
         self.dragged_item = None
 
+    def on_tree_folder_open(self, event):
+        folder_id = self.tree.focus()
+        if not self.virtualize_trees or not folder_id or not self.is_folder(folder_id):
+            return
+        folder_path = self.tree_item_paths[folder_id]
+        self.open_folder_paths.add(folder_path)
+        # The folder is the core's live dict, so it is only walked under the core's lock
+        with self.core.lock:
+            folder = self.get_item_by_path(self.current_date, folder_path)
+            self.reconcile_tree_items(folder_id, folder, folder_path)
+        tracking_log.debug("Expanded folder: %s", folder_path)
+
+    def on_tree_folder_close(self, event):
+        folder_id = self.tree.focus()
+        if not self.virtualize_trees or not folder_id or not self.is_folder(folder_id):
+            return
+        folder_path = self.tree_item_paths[folder_id]
+        self.open_folder_paths.discard(folder_path)
+        with self.core.lock:
+            folder = self.get_item_by_path(self.current_date, folder_path)
+            self.collapse_tree_folder(folder_id, folder)
+        tracking_log.debug("Collapsed folder: %s", folder_path)
+
+    def collapse_tree_folder(self, folder_id, folder):
+        # Drop the folder's rows, leaving one placeholder so Tk still draws the expand arrow
+        has_placeholder = False
+        for child_id in self.tree.get_children(folder_id):
+            if self.tree.tag_has('placeholder', child_id):
+                has_placeholder = True
+            else:
+                self.forget_tree_item(child_id)
+                self.tree.delete(child_id)
+        has_children = bool(folder.get('folders') or folder.get('items'))
+        if has_children and not has_placeholder:
+            self.tree.insert(folder_id, 'end', text='...', tags=('placeholder',))
+        elif has_placeholder and not has_children:
+            self.tree.delete(*self.tree.get_children(folder_id))
+
     def is_folder(self, item_id):
-        return self.tree.get_children(item_id) != ()
-
-    def update_data_order(self):
-        # Reconstruct the data structure based on the Treeview order
-        def build_data_from_tree(parent_item):
-            data_list = []
-            for child_id in self.tree.get_children(parent_item):
-                item_name = self.tree.item(child_id)['text']
-                item_path = self.tree_item_paths.get(child_id, '')
-                item_data = self.get_item_by_path(self.data[self.current_date], item_path.split('/'))
-                if self.is_folder(child_id):
-                    # Folder
-                    folder_data = {
-                        'name': item_name,
-                        'folders': [],
-                        'items': []
-                    }
-                    # Recursively build folder contents
-                    child_data = build_data_from_tree(child_id)
-                    folder_data['folders'] = child_data.get('folders', [])
-                    folder_data['items'] = child_data.get('items', [])
-                    data_list.append(folder_data)
-                else:
-                    # Item
-                    data_list.append({
-                        'name': item_name,
-                        'type': item_data['type'],
-                        'value': item_data['value']
-                    })
-            return {'folders': [item for item in data_list if 'folders' in item],
-                    'items': [item for item in data_list if 'type' in item]}
-
-        print("Updating data order based on Treeview.")
-        new_data = build_data_from_tree('')
-        self.data[self.current_date] = new_data
-        print("Data structure updated.")
-
-    def get_item_by_path(self, data_dict, path_list):
-        if not path_list:
-            return data_dict
-        key = path_list[0]
-        # Search in folders
-        for folder in data_dict.get('folders', []):
-            if folder['name'] == key:
-                return self.get_item_by_path(folder, path_list[1:])
-        # Search in items
-        for item in data_dict.get('items', []):
-            if item['name'] == key:
-                return item
-        return None
+        # Tagged on insert so empty folders still count as folders
+        return self.tree.tag_has('folder', item_id)
+
+    def update_data_order(self, item_id):
+        # Turn a drag-drop in the Treeview into one move: the row's old path, its new parent
+        # folder and its position among that folder's folders or items. Returns the change,
+        # or None if the row was a placeholder, ended up where it was or can't go there.
+        if item_id not in self.tree_item_paths:
+            # A folder's placeholder row
+            return None
+        old_path = self.tree_item_paths[item_id]
+        parent_id = self.tree.parent(item_id)
+        parent_path = self.tree_item_paths.get(parent_id, '')
+        is_folder = self.is_folder(item_id)
+
+        siblings = self.tree.get_children(parent_id)
+        collapsed = any(self.tree.tag_has('placeholder', row) for row in siblings)
+        if collapsed:
+            # Dropped into a collapsed virtual folder, whose contents have no rows: append
+            with self.core.lock:
+                destination = self.get_item_by_path(self.current_date, parent_path)
+                index = len(destination.get('folders' if is_folder else 'items', []))
+        else:
+            index = 0
+            for sibling_id in siblings[:siblings.index(item_id)]:
+                if self.is_folder(sibling_id) == is_folder:
+                    index += 1
+        change = self.core.move(self.current_date, old_path, parent_path, index)
+        if change is None:
+            # Put the row back if the drop was refused
+            self.refresh_items()
+            return None
+
+        new_path = join_path(parent_path, old_path.rpartition('/')[2])
+        if collapsed:
+            self.forget_tree_item(item_id)
+            self.tree.delete(item_id)
+        elif new_path != old_path:
+            self.rename_tree_rows(item_id, new_path)
+        return change
+
+    def rename_tree_rows(self, node_id, node_path):
+        # A moved folder's rows keep their ids; only the paths they map to change
+        old_path = self.tree_item_paths.get(node_id)
+        if old_path in self.open_folder_paths:
+            self.open_folder_paths.discard(old_path)
+            self.open_folder_paths.add(node_path)
+        self.tree_item_paths[node_id] = node_path
+        for child_id in self.tree.get_children(node_id):
+            if not self.tree.tag_has('placeholder', child_id):
+                self.rename_tree_rows(child_id, join_path(node_path, self.tree.item(child_id, 'text')))
+
+    def get_item_by_path(self, date, item_path):
+        return self.core.get(date, item_path)
 
     def add_folder(self):
         new_folder_window = tk.Toplevel(self.root)
@@ -263,20 +2646,17 @@ class DailyTrackingApp:
         def save_folder():
             folder_name = entry.get()
             if folder_name:
-                if self.current_date not in self.data:
-                    self.data[self.current_date] = {'folders': [], 'items': []}
                 # Find selected folder or root
                 selected_item = self.tree.selection()
                 parent_folder_id = ''
                 if selected_item:
                     selected_id = selected_item[0]
                     parent_folder_id = selected_id
-                    print("Selected parent folder:", self.tree.item(selected_id)['text'])
+                    tracking_log.debug("Selected parent folder: %s", self.tree.item(selected_id)['text'])
                 else:
-                    print("No folder selected. Adding to root.")
+                    tracking_log.debug("No folder selected. Adding to root.")
                 # Add folder to data
                 self.add_folder_to_data(folder_name, parent_folder_id)
-                self.save_data()
                 self.refresh_items()
                 new_folder_window.destroy()
 
@@ -287,25 +2667,8 @@ class DailyTrackingApp:
         save_button.pack()
 
     def add_folder_to_data(self, folder_name, parent_folder_id):
-        if parent_folder_id:
-            parent_data = self.get_data_from_tree_item(parent_folder_id)
-            if 'folders' not in parent_data:
-                parent_data['folders'] = []
-            parent_data['folders'].append({
-                'name': folder_name,
-                'folders': [],
-                'items': []
-            })
-        else:
-            # Add to root
-            if self.current_date not in self.data:
-                self.data[self.current_date] = {'folders': [], 'items': []}
-            self.data[self.current_date]['folders'].append({
-                'name': folder_name,
-                'folders': [],
-                'items': []
-            })
-        print("Added folder:", folder_name)
+        parent_path = self.tree_item_paths.get(parent_folder_id, '')
+        return self.core.add_folder(self.current_date, parent_path, folder_name)
 
     def add_item(self):
         new_item_window = tk.Toplevel(self.root)
@@ -332,20 +2695,17 @@ class DailyTrackingApp:
             item_name = entry.get()
             item_type = type_var.get()
             if item_name:
-                if self.current_date not in self.data:
-                    self.data[self.current_date] = {'folders': [], 'items': []}
                 # Find selected folder or root
                 selected_item = self.tree.selection()
                 parent_folder_id = ''
                 if selected_item:
                     selected_id = selected_item[0]
                     parent_folder_id = selected_id
-                    print("Selected parent folder:", self.tree.item(selected_id)['text'])
+                    tracking_log.debug("Selected parent folder: %s", self.tree.item(selected_id)['text'])
                 else:
-                    print("No folder selected. Adding to root.")
+                    tracking_log.debug("No folder selected. Adding to root.")
                 # Add item to data
                 self.add_item_to_data(item_name, item_type, parent_folder_id)
-                self.save_data()
                 self.refresh_items()
                 new_item_window.destroy()
 
@@ -361,27 +2721,16 @@ class DailyTrackingApp:
         type_dropdown.bind('<Tab>', lambda event: save_button.focus_set())
 
     def add_item_to_data(self, item_name, item_type, parent_folder_id):
-        new_item = {
-            'name': item_name,
-            'type': item_type,
-            'value': self.get_default_value(item_type)
-        }
-        if parent_folder_id:
-            parent_data = self.get_data_from_tree_item(parent_folder_id)
-            if 'items' not in parent_data:
-                parent_data['items'] = []
-            parent_data['items'].append(new_item)
-        else:
-            # Add to root
-            if self.current_date not in self.data:
-                self.data[self.current_date] = {'folders': [], 'items': []}
-            self.data[self.current_date]['items'].append(new_item)
-        print("Added item:", item_name)
-
-    def get_data_from_tree_item(self, item_id):
-        item_path = self.tree_item_paths.get(item_id, '')
-        data = self.get_item_by_path(self.data[self.current_date], item_path.split('/'))
-        return data
+        parent_path = self.tree_item_paths.get(parent_folder_id, '')
+        return self.core.add_item(self.current_date, parent_path, item_name, item_type)
+
+    def on_data_changed(self, change, catalog_ids, changed_ids):
+        # Called by the core after each change; every change is made from the Tk thread
+        if changed_ids:
+            self.graph_image_cache.invalidate(changed_ids)
+            graphs_log.debug("Invalidated cached graphs for items %s.", sorted(changed_ids))
+        if catalog_ids and self.graphs_tab_created:
+            self.update_graph_tree_items(catalog_ids)
 
     def dropdown_key_navigation(self, event):
         widget = event.widget
@@ -390,49 +2739,25 @@ class DailyTrackingApp:
             return 'break'
 
     def copy_previous(self):
-        print("Copying previous day's data.")
+        tracking_log.debug("Copying previous day's data.")
         previous_date = self.get_previous_date(self.current_date)
-        print("Previous date:", previous_date)
-        if previous_date and previous_date in self.data:
-            # Use deepcopy to avoid shared references
-            self.data[self.current_date] = copy.deepcopy(self.data[previous_date])
-            print("Copied data from previous date to current date using deepcopy.")
-            self.save_data()
+        tracking_log.debug("Previous date: %s", previous_date)
+        if self.core.copy_day(self.current_date, previous_date, True) is not None:
+            tracking_log.debug("Copied data from previous date to current date.")
             self.refresh_items()
         else:
-            print("No previous date to copy from.")
+            tracking_log.debug("No previous date to copy from.")
 
     def copy_previous_items_only(self):
-        print("Copying previous day's items without data.")
+        tracking_log.debug("Copying previous day's items without data.")
         previous_date = self.get_previous_date(self.current_date)
-        print("Previous date:", previous_date)
-        if previous_date and previous_date in self.data:
-            # Copy item names and types without values
-            self.data[self.current_date] = copy.deepcopy(self.data[previous_date])
-            self.clear_values(self.data[self.current_date])
-            print("Copied items from previous date without values.")
-            self.save_data()
+        tracking_log.debug("Previous date: %s", previous_date)
+        # Copy item names and types without values
+        if self.core.copy_day(self.current_date, previous_date, False) is not None:
+            tracking_log.debug("Copied items from previous date without values.")
             self.refresh_items()
         else:
-            print("No previous date to copy items from.")
-
-    def clear_values(self, data_dict):
-        if 'folders' in data_dict:
-            for folder in data_dict['folders']:
-                self.clear_values(folder)
-        if 'items' in data_dict:
-            for item in data_dict['items']:
-                item['value'] = self.get_default_value(item['type'])
-
-    def get_default_value(self, item_type):
-        if item_type == "complete/incomplete":
-            return False
-        elif item_type in ["float", "int"]:
-            return 0
-        elif item_type == "string":
-            return ""
-        else:
-            return None
+            tracking_log.debug("No previous date to copy items from.")
 
     def get_previous_date(self, date_str):
         date_obj = datetime.strptime(date_str, "%Y-%m-%d")
@@ -449,233 +2774,887 @@ class DailyTrackingApp:
     def go_to_previous_day(self):
         self.current_date = self.get_previous_date(self.current_date)
         self.date_label.config(text="Date: " + self.current_date)
-        if self.current_date not in self.data:
+        if not self.core.has_date(self.current_date):
             self.copy_previous_items_only()
         self.refresh_items()
 
     def go_to_next_day(self):
         self.current_date = self.get_next_date(self.current_date)
         self.date_label.config(text="Date: " + self.current_date)
-        if self.current_date not in self.data:
+        if not self.core.has_date(self.current_date):
             self.copy_previous_items_only()
         self.refresh_items()
 
+    @timed_method('refresh_items')
     def refresh_items(self):
-        # Clear the Treeview
-        self.tree.delete(*self.tree.get_children())
-        self.tree_item_paths.clear()
-        # Reload items
+        # Days can be created from __init__ before the widgets exist; load_items picks them up later
+        if not hasattr(self, 'tree'):
+            return
         self.load_items()
 
     def load_items(self):
-        if self.current_date in self.data:
-            self.insert_tree_items('', self.data[self.current_date], parent_path='')
-        else:
-            print("No items for current date.")
-
-    def insert_tree_items(self, parent, data_dict, parent_path=''):
-        # Insert folders
-        for folder in data_dict.get('folders', []):
-            folder_id = self.tree.insert(parent, 'end', text=folder['name'], open=True)
-            folder_path = f"{parent_path}/{folder['name']}" if parent_path else folder['name']
-            self.tree_item_paths[folder_id] = folder_path
-            self.insert_tree_items(folder_id, folder, folder_path)
-        # Insert items
-        for item in data_dict.get('items', []):
-            item_id = self.tree.insert(parent, 'end', text=item['name'], values=(item['value'],))
-            item_path = f"{parent_path}/{item['name']}" if parent_path else item['name']
-            self.tree_item_paths[item_id] = item_path
+        # The day's dict is walked as the rows are reconciled, so the core stays locked meanwhile
+        with self.core.lock:
+            day_data = self.core.day(self.current_date)
+            if day_data is None:
+                tracking_log.debug("No items for current date.")
+                day_data = {}
+            self.reconcile_tree_items('', day_data, parent_path='')
+
+    def reconcile_tree_items(self, parent, data_dict, parent_path=''):
+        # Bring parent's children in line with data_dict, reusing existing rows matched by
+        # kind and name and only moving, updating, inserting or deleting the ones that differ
+        unused = {}
+        for child_id in self.tree.get_children(parent):
+            if self.tree.tag_has('placeholder', child_id):
+                # Reconciling a folder's children means it is expanded
+                self.tree.delete(child_id)
+                continue
+            key = (self.is_folder(child_id), self.tree.item(child_id, 'text'))
+            unused.setdefault(key, []).append(child_id)
+
+        wanted = [(True, folder) for folder in data_dict.get('folders', [])]
+        wanted += [(False, item) for item in data_dict.get('items', [])]
+        for index, (is_folder, node) in enumerate(wanted):
+            node_path = join_path(parent_path, node['name'])
+            matches = unused.get((is_folder, node['name']))
+            if matches:
+                node_id = matches.pop(0)
+                if self.tree.index(node_id) != index:
+                    self.tree.move(node_id, parent, index)
+                    tracking_log.debug("Moved tree row: %s", node_path)
+            elif is_folder:
+                is_open = not self.virtualize_trees or node_path in self.open_folder_paths
+                node_id = self.tree.insert(parent, index, text=node['name'], open=is_open, tags=('folder',))
+                tracking_log.debug("Inserted folder row: %s", node_path)
+            else:
+                node_id = self.tree.insert(parent, index, text=node['name'], tags=('item',))
+                tracking_log.debug("Inserted item row: %s", node_path)
+            self.tree_item_paths[node_id] = node_path
+            if is_folder and self.virtualize_trees and node_path not in self.open_folder_paths:
+                self.collapse_tree_folder(node_id, node)
+            elif is_folder:
+                self.reconcile_tree_items(node_id, node, node_path)
+            elif self.tree_item_values.get(node_id) != repr(node['value']):
+                # repr keeps False and 0 apart, which compare equal
+                self.tree.item(node_id, values=(node['value'],))
+                self.tree_item_values[node_id] = repr(node['value'])
+
+        for leftover_ids in unused.values():
+            for node_id in leftover_ids:
+                self.forget_tree_item(node_id)
+                self.tree.delete(node_id)
+                tracking_log.debug("Deleted tree row: %s", node_id)
+
+    def forget_tree_item(self, node_id):
+        for child_id in self.tree.get_children(node_id):
+            self.forget_tree_item(child_id)
+        self.tree_item_paths.pop(node_id, None)
+        self.tree_item_values.pop(node_id, None)
 
     def create_graphs_tab(self):
-        print("Creating graphs tab content.")
+        graphs_log.debug("Creating graphs tab content.")
         # Paned window dividing item selection and graph view
         self.graphs_pane = ttk.PanedWindow(self.graphs_frame, orient=tk.HORIZONTAL)
         self.graphs_pane.pack(fill=tk.BOTH, expand=1)
-        print("Created graphs pane.")
+        graphs_log.debug("Created graphs pane.")
 
         # Item selection pane
         self.item_selection_pane = ttk.Frame(self.graphs_pane, width=200)
         self.graphs_pane.add(self.item_selection_pane, weight=1)
-        print("Created item selection pane.")
+        graphs_log.debug("Created item selection pane.")
 
         # Graph view pane
         self.graph_view_pane = ttk.Frame(self.graphs_pane)
         self.graphs_pane.add(self.graph_view_pane, weight=4)
-        print("Created graph view pane.")
+        graphs_log.debug("Created graph view pane.")
+
+        # Aggregation options above the graph
+        self.graph_controls = ttk.Frame(self.graph_view_pane)
+        self.graph_controls.pack(fill=tk.X)
+        self.pack_padded(ttk.Label(self.graph_controls, text="Show:"), pady=False, side='left')
+        self.graph_aggregation = tk.StringVar(value="Daily")
+        # Offers only the modes that apply to the selected items (see plot_item)
+        self.aggregation_dropdown = ttk.Combobox(self.graph_controls, textvariable=self.graph_aggregation,
+                                                 values=list(AGGREGATIONS), state="readonly")
+        self.pack_padded(self.aggregation_dropdown, padx=False, side='left')
+        self.aggregation_dropdown.bind('<<ComboboxSelected>>', self.plot_item)
+        graphs_log.debug("Created graph aggregation dropdown.")
+
+        # How several selected items are drawn
+        self.pack_padded(ttk.Label(self.graph_controls, text="Layout:"), pady=False, side='left')
+        self.graph_layout = tk.StringVar(value="Overlay")
+        layout_dropdown = ttk.Combobox(self.graph_controls, textvariable=self.graph_layout,
+                                       values=["Overlay", "Small multiples"], state="readonly")
+        self.pack_padded(layout_dropdown, padx=False, side='left')
+        layout_dropdown.bind('<<ComboboxSelected>>', self.plot_item)
+        graphs_log.debug("Created graph layout dropdown.")
+
+        # Progress of the background history load
+        self.history_status = ttk.Label(self.graph_controls, text="")
+        self.pack_padded(self.history_status, pady=False, side='right')
 
         # Treeview for item selection
-        self.graph_tree = ttk.Treeview(self.item_selection_pane)
+        self.graph_tree = ttk.Treeview(self.item_selection_pane, selectmode='extended')
         self.graph_tree.pack(fill=tk.BOTH, expand=1)
+        self.graph_tree['columns'] = ('Days', 'Dates')
+        self.graph_tree.heading('#0', text='Item')
+        self.graph_tree.heading('Days', text='Days')
+        self.graph_tree.heading('Dates', text='Dates')
+        self.graph_tree.column('Days', width=50, anchor='e')
         self.graph_tree.bind('<<TreeviewSelect>>', self.plot_item)
-        print("Created Treeview for graph item selection.")
+        self.graph_tree.bind('<<TreeviewOpen>>', self.on_graph_folder_open)
+        self.graph_tree.bind('<<TreeviewClose>>', self.on_graph_folder_close)
+        graphs_log.debug("Created Treeview for graph item selection.")
 
-        self.populate_graph_tree()
-        print("Populated graph Treeview.")
+        # One figure and canvas per pane, created on the first plot and reused after that
+        self.graph_canvas = None
 
     def create_settings_tab(self):
-        print("Creating settings tab content.")
+        settings_log.debug("Creating settings tab content.")
         padding_label = ttk.Label(self.settings_frame, text="UI Padding:")
         padding_label.pack()
-        print("Created padding label.")
+        settings_log.debug("Created padding label.")
 
         padding_var = tk.DoubleVar(value=self.ui_padding)
         padding_spinbox = ttk.Spinbox(self.settings_frame, from_=0, to=50, increment=1, textvariable=padding_var)
         padding_spinbox.pack()
-        print("Created padding spinbox.")
+        settings_log.debug("Created padding spinbox.")
 
         scale_label = ttk.Label(self.settings_frame, text="UI Scale:")
         scale_label.pack()
-        print("Created scale label.")
+        settings_log.debug("Created scale label.")
 
         scale_var = tk.DoubleVar(value=self.ui_scale)
         scale_spinbox = ttk.Spinbox(self.settings_frame, from_=0.5, to=3.0, increment=0.1, textvariable=scale_var)
         scale_spinbox.pack()
-        print("Created scale spinbox.")
+        settings_log.debug("Created scale spinbox.")
+
+        save_delay_label = ttk.Label(self.settings_frame, text="Save Delay (seconds):")
+        save_delay_label.pack()
+        settings_log.debug("Created save delay label.")
+
+        save_delay_var = tk.DoubleVar(value=self.save_delay)
+        save_delay_spinbox = ttk.Spinbox(self.settings_frame, from_=0.0, to=30.0, increment=0.5,
+                                         textvariable=save_delay_var)
+        save_delay_spinbox.pack()
+        settings_log.debug("Created save delay spinbox.")
+
+        virtualize_var = tk.BooleanVar(value=self.virtualize_trees)
+        virtualize_check = ttk.Checkbutton(self.settings_frame, text="Only load rows of expanded folders",
+                                           variable=virtualize_var)
+        self.pack_padded(virtualize_check, padx=False)
+        settings_log.debug("Created virtualize trees checkbox.")
 
         def apply_settings():
-            self.ui_padding = padding_var.get()
-            self.ui_scale = scale_var.get()
-            print("Applied settings: UI Padding =", self.ui_padding, ", UI Scale =", self.ui_scale)
-            self.refresh_ui()
+            padding = padding_var.get()
+            scale = scale_var.get()
+            virtualize = virtualize_var.get()
+            self.save_delay = save_delay_var.get()
+            self.core.set_save_delay(self.save_delay)
+            # Only what changed is reconfigured, in place
+            if padding != self.ui_padding:
+                self.ui_padding = padding
+                self.apply_ui_padding()
+            if scale != self.ui_scale:
+                self.ui_scale = scale
+                self.apply_ui_scale()
+            if virtualize != self.virtualize_trees:
+                self.virtualize_trees = virtualize
+                self.reload_trees()
+            settings_log.debug("Applied settings: UI Padding = %s, UI Scale = %s, Virtualize trees = %s",
+                               self.ui_padding, self.ui_scale, self.virtualize_trees)
+            self.save_settings()
 
         apply_button = ttk.Button(self.settings_frame, text="Apply", command=apply_settings)
-        apply_button.pack(pady=self.ui_padding)
-        print("Created apply settings button.")
-
-    def refresh_ui(self):
-        print("Refreshing UI with new settings.")
-        # Recreate widgets with new padding and scale
-        for widget in self.root.winfo_children():
-            widget.destroy()
-            print("Destroyed widget:", widget)
-        self.create_widgets()
-        print("Recreated widgets with updated settings.")
+        self.pack_padded(apply_button, padx=False)
+        settings_log.debug("Created apply settings button.")
+
+        self.create_diagnostics_section()
+        settings_log.debug("Created diagnostics section.")
+
+    def create_diagnostics_section(self):
+        diagnostics_frame = ttk.LabelFrame(self.settings_frame, text="Diagnostics")
+        self.pack_padded(diagnostics_frame, fill='both', expand=True)
+
+        self.data_size_label = ttk.Label(diagnostics_frame)
+        self.data_size_label.pack()
+
+        columns = ('Calls', 'Mean ms', 'P95 ms', 'Max ms', 'Data size')
+        self.diagnostics_tree = ttk.Treeview(diagnostics_frame, columns=columns, height=6)
+        self.diagnostics_tree.heading('#0', text='Operation')
+        for column in columns:
+            self.diagnostics_tree.heading(column, text=column)
+            self.diagnostics_tree.column(column, width=80, anchor='e')
+        self.diagnostics_tree.pack(fill='both', expand=True)
+
+        buttons_frame = ttk.Frame(diagnostics_frame)
+        buttons_frame.pack()
+        self.pack_padded(ttk.Button(buttons_frame, text="Refresh", command=self.refresh_diagnostics), side='left')
+        self.pack_padded(ttk.Button(buttons_frame, text="Export JSON...", command=self.export_diagnostics),
+                         side='left')
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        size = self.core.data_size()
+        self.data_size_label.config(text="Dates: %d (loaded: %d), schema versions: %d" % (
+            size['dates'], size['loaded_dates'], size['schema_versions']))
+        self.diagnostics_tree.delete(*self.diagnostics_tree.get_children())
+        for name, stats in sorted(perf_stats.snapshot().items()):
+            self.diagnostics_tree.insert('', 'end', text=name, values=(
+                stats['count'],
+                "%.1f" % (stats['total_ms'] / stats['count']),
+                "%.1f" % perf_stats.percentile_ms(stats, 0.95),
+                "%.1f" % stats['max_ms'],
+                stats['data_size'] if stats['data_size'] is not None else ''))
+        settings_log.debug("Refreshed diagnostics.")
+
+    def export_diagnostics(self):
+        path = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('JSON', '*.json')],
+                                            initialfile='track_and_graph_perf.json')
+        if path:
+            perf_stats.export_json(path, {'data_size': self.core.data_size()})
+            settings_log.debug("Exported diagnostics to %s", path)
+
+    def load_settings(self):
+        # A missing or unreadable settings file leaves the defaults
+        try:
+            with open(self.settings_file) as f:
+                settings = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.ui_padding = settings.get('ui_padding', self.ui_padding)
+        self.ui_scale = settings.get('ui_scale', self.ui_scale)
+        self.virtualize_trees = settings.get('virtualize_trees', self.virtualize_trees)
+        self.save_delay = settings.get('save_delay', self.save_delay)
+        settings_log.debug("Loaded settings from %s", self.settings_file)
+
+    def save_settings(self):
+        # Only written when settings are applied; renamed into place so it is never half written
+        temp_path = self.settings_file + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'ui_padding': self.ui_padding, 'ui_scale': self.ui_scale,
+                           'virtualize_trees': self.virtualize_trees, 'save_delay': self.save_delay}, f)
+            os.replace(temp_path, self.settings_file)
+        except OSError as error:
+            settings_log.warning("Could not save settings: %s", error)
+
+    def pack_padded(self, widget, padx=True, pady=True, **options):
+        # Packs widget with the UI padding on the chosen axes; apply_ui_padding changes it later
+        self.padded_widgets.append((widget, padx, pady))
+        widget.pack(**options, **self.padding_options(padx, pady))
+
+    def padding_options(self, padx, pady):
+        options = {}
+        if padx:
+            options['padx'] = self.ui_padding
+        if pady:
+            options['pady'] = self.ui_padding
+        return options
+
+    def apply_ui_padding(self):
+        self.padded_widgets = [(widget, padx, pady) for widget, padx, pady in self.padded_widgets
+                               if widget.winfo_exists()]
+        for widget, padx, pady in self.padded_widgets:
+            widget.pack_configure(**self.padding_options(padx, pady))
+
+    def apply_ui_scale(self):
+        # Widgets draw their text with Tk's named fonts, so resizing those rescales every
+        # existing widget. Sizes are set in pixels so they don't also follow tk scaling, which
+        # is scaled for the point sizes of everything else.
+        if self.base_font_sizes is None:
+            self.base_scaling = float(self.root.tk.call('tk', 'scaling'))
+            self.base_font_sizes = {}
+            for name in ('TkDefaultFont', 'TkTextFont', 'TkFixedFont', 'TkMenuFont', 'TkHeadingFont',
+                         'TkCaptionFont', 'TkSmallCaptionFont', 'TkIconFont', 'TkTooltipFont'):
+                size = tkfont.nametofont(name, root=self.root).cget('size')
+                # Positive sizes are points, negative ones pixels
+                self.base_font_sizes[name] = size * self.base_scaling if size > 0 else -size
+        for name, pixels in self.base_font_sizes.items():
+            tkfont.nametofont(name, root=self.root).configure(size=-max(1, round(pixels * self.ui_scale)))
+        self.root.tk.call('tk', 'scaling', self.base_scaling * self.ui_scale)
+        # Treeview rows have a fixed height, so it follows the font through the style
+        linespace = tkfont.nametofont('TkDefaultFont', root=self.root).metrics('linespace')
+        ttk.Style(self.root).configure('Treeview', rowheight=linespace + 4)
+        settings_log.debug("Scaled fonts to %s.", self.ui_scale)
+
+    def reload_trees(self):
+        # Folders' rows are created differently when trees are virtualized, so both trees are
+        # drawn again from the data already in memory
+        for row_id in self.tree.get_children():
+            self.forget_tree_item(row_id)
+        self.tree.delete(*self.tree.get_children())
+        self.open_folder_paths.clear()
+        self.load_items()
+        if self.graphs_tab_created:
+            self.populate_graph_tree()
 
+    @timed_method('populate_graph_tree')
     def populate_graph_tree(self):
-        print("Populating graph Treeview.")
+        graphs_log.debug("Populating graph Treeview.")
+        # Drawn from the catalog; the selection is kept for items that are still listed
+        selected_ids = {self.graph_tree_item_ids[row_id] for row_id in self.graph_tree.selection()
+                        if row_id in self.graph_tree_item_ids}
         self.graph_tree.delete(*self.graph_tree.get_children())
-        # Build a set of all items across dates
-        all_items = {}
-        for date in self.data:
-            self.collect_graph_items('', self.data[date], all_items)
-        # Insert items into the Treeview
-        self.insert_graph_tree_items('', all_items)
-        print("Inserted items into graph Treeview.")
-
-    def collect_graph_items(self, parent_path, data_dict, all_items):
-        if 'folders' in data_dict:
-            for folder_name, folder_data in data_dict['folders'].items():
-                folder_path = f"{parent_path}/{folder_name}" if parent_path else folder_name
-                if folder_path not in all_items:
-                    all_items[folder_path] = {'folders': {}, 'items': {}}
-                self.collect_graph_items(folder_path, folder_data, all_items[folder_path])
-        if 'items' in data_dict:
-            for item_name, item_info in data_dict['items'].items():
-                item_path = f"{parent_path}/{item_name}" if parent_path else item_name
-                if item_info['type'] in ["float", "int", "complete/incomplete"]:
-                    all_items.setdefault(parent_path, {'folders': {}, 'items': {}})
-                    all_items[parent_path]['items'][item_name] = item_info['type']
-        else:
-            for key, value in data_dict.items():
-                if isinstance(value, dict) and 'type' in value:
-                    item_name = key
-                    item_info = value
-                    if item_info['type'] in ["float", "int", "complete/incomplete"]:
-                        all_items.setdefault(parent_path, {'folders': {}, 'items': {}})
-                        all_items[parent_path]['items'][item_name] = item_info['type']
-
-    def insert_graph_tree_items(self, parent, items_dict):
+        self.graph_tree_item_ids.clear()
+        self.graph_tree_item_rows.clear()
+        self.graph_tree_folders.clear()
+        self.graph_tree_folder_rows.clear()
+        self.insert_graph_tree_items('', self.core.catalog_tree())
+        if selected_ids:
+            self.graph_tree.selection_set([row_id for row_id, node_id in self.graph_tree_item_ids.items()
+                                           if node_id in selected_ids])
+        graphs_log.debug("Inserted %s items into graph Treeview.", len(self.graph_tree_item_ids))
+
+    @timed_method('update_graph_tree_items')
+    def update_graph_tree_items(self, node_ids):
+        # Redraw only the rows of items whose catalog entries changed: counts and dates are
+        # updated in place, and an item that moved, appeared or is gone has its row moved,
+        # inserted or deleted. Selected items stay selected.
+        selected = set(self.graph_tree.selection())
+        reselect = []
+        vacated = False
+        for node_id in node_ids:
+            entry = self.core.catalog_entry(node_id)
+            row = self.graph_tree_item_rows.get(node_id)
+            if row is not None and entry is not None and row[1] == entry.path:
+                self.graph_tree.item(row[0], values=self.graph_tree_values(entry))
+                continue
+            # The item may have left a folder, even one collapsed with no row for it
+            vacated = True
+            if row is not None:
+                if row[0] in selected:
+                    reselect.append(node_id)
+                self.forget_graph_tree_item(row[0])
+                self.graph_tree.delete(row[0])
+            if entry is not None:
+                self.insert_graph_tree_item(node_id, entry)
+        if vacated:
+            self.prune_graph_tree_folders()
+        rows = [self.graph_tree_item_rows[node_id][0] for node_id in reselect if node_id in self.graph_tree_item_rows]
+        if rows:
+            self.graph_tree.selection_add(rows)
+        graphs_log.debug("Updated %s items in graph Treeview.", len(node_ids))
+
+    def insert_graph_tree_item(self, node_id, entry):
+        # One item's row, under folder rows created as needed. Nothing is inserted into a
+        # collapsed virtual folder; its contents are read from the catalog when it is opened.
+        *folder_names, item_name = entry.path.split('/')
+        parent, parent_path = '', ''
+        for folder_name in folder_names:
+            parent_path = join_path(parent_path, folder_name)
+            folder_id = self.graph_tree_folder_rows.get(parent_path)
+            if folder_id is None:
+                # Folders go before the items, as populate_graph_tree draws them
+                index = sum(1 for child_id in self.graph_tree.get_children(parent) if child_id in self.graph_tree_folders)
+                folder_id = self.insert_graph_tree_folder(parent, index, folder_name, parent_path)
+            if self.virtualize_trees and not self.graph_tree.item(folder_id, 'open'):
+                return
+            parent = folder_id
+        self.insert_graph_tree_row(parent, item_name, node_id, entry)
+
+    def prune_graph_tree_folders(self):
+        # Drop folder rows that no catalogued item is under any more
+        live_paths = set(iter_catalog_folders(self.core.catalog_tree()))
+        for folder_path in sorted(self.graph_tree_folder_rows):
+            folder_id = self.graph_tree_folder_rows.get(folder_path)
+            if folder_id is not None and folder_path not in live_paths:
+                self.forget_graph_tree_item(folder_id)
+                self.graph_tree.delete(folder_id)
+                graphs_log.debug("Removed empty folder from graph Treeview: %s", folder_path)
+
+    def insert_graph_tree_items(self, parent, items_dict, parent_path=''):
         for folder_name, folder_data in items_dict.get('folders', {}).items():
-            folder_id = self.graph_tree.insert(parent, 'end', text=folder_name, open=True)
-            self.insert_graph_tree_items(folder_id, folder_data)
-            print("Inserted folder into graph Treeview:", folder_name)
-        for item_name in items_dict.get('items', {}):
-            item_id = self.graph_tree.insert(parent, 'end', text=item_name)
-            print("Inserted item into graph Treeview:", item_name)
+            folder_path = join_path(parent_path, folder_name)
+            folder_id = self.insert_graph_tree_folder(parent, 'end', folder_name, folder_path)
+            if not self.virtualize_trees:
+                self.insert_graph_tree_items(folder_id, folder_data, folder_path)
+        for item_name, node_id in items_dict.get('items', []):
+            self.insert_graph_tree_row(parent, item_name, node_id, self.core.catalog_entry(node_id))
+
+    def insert_graph_tree_folder(self, parent, index, folder_name, folder_path):
+        if self.virtualize_trees:
+            # Contents are inserted by on_graph_folder_open
+            folder_id = self.graph_tree.insert(parent, index, text=folder_name, open=False)
+            self.graph_tree.insert(folder_id, 'end', text='...', tags=('placeholder',))
+        else:
+            folder_id = self.graph_tree.insert(parent, index, text=folder_name, open=True)
+        self.graph_tree_folders[folder_id] = folder_path
+        self.graph_tree_folder_rows[folder_path] = folder_id
+        graphs_log.debug("Inserted folder into graph Treeview: %s", folder_name)
+        return folder_id
+
+    def insert_graph_tree_row(self, parent, item_name, node_id, entry):
+        item_id = self.graph_tree.insert(parent, 'end', text=item_name, values=self.graph_tree_values(entry))
+        self.graph_tree_item_ids[item_id] = node_id
+        self.graph_tree_item_rows[node_id] = (item_id, entry.path)
+        graphs_log.debug("Inserted item into graph Treeview: %s", item_name)
+
+    def graph_tree_values(self, entry):
+        return entry.count, f"{entry.first_date} to {entry.last_date}"
+
+    def on_graph_folder_open(self, event):
+        folder_id = self.graph_tree.focus()
+        if not self.virtualize_trees or folder_id not in self.graph_tree_folders:
+            return
+        folder_path = self.graph_tree_folders[folder_id]
+        folder_data = self.core.catalog_tree()
+        for folder_name in folder_path.split('/'):
+            folder_data = folder_data['folders'].get(folder_name, {'folders': {}, 'items': []})
+        self.graph_tree.delete(*self.graph_tree.get_children(folder_id))
+        self.insert_graph_tree_items(folder_id, folder_data, folder_path)
+        graphs_log.debug("Expanded graph folder: %s", folder_path)
+
+    def on_graph_folder_close(self, event):
+        folder_id = self.graph_tree.focus()
+        if not self.virtualize_trees or folder_id not in self.graph_tree_folders:
+            return
+        for child_id in self.graph_tree.get_children(folder_id):
+            self.forget_graph_tree_item(child_id)
+        self.graph_tree.delete(*self.graph_tree.get_children(folder_id))
+        self.graph_tree.insert(folder_id, 'end', text='...', tags=('placeholder',))
+        graphs_log.debug("Collapsed graph folder: %s", self.graph_tree_folders[folder_id])
+
+    def forget_graph_tree_item(self, row_id):
+        # Drops a row and the rows under it from the maps; the maps back to rows are only
+        # cleared while they still point at this row
+        for child_id in self.graph_tree.get_children(row_id):
+            self.forget_graph_tree_item(child_id)
+        node_id = self.graph_tree_item_ids.pop(row_id, None)
+        if node_id is not None and self.graph_tree_item_rows.get(node_id, (None,))[0] == row_id:
+            del self.graph_tree_item_rows[node_id]
+        folder_path = self.graph_tree_folders.pop(row_id, None)
+        if folder_path is not None and self.graph_tree_folder_rows.get(folder_path) == row_id:
+            del self.graph_tree_folder_rows[folder_path]
 
     def plot_item(self, event):
-        print("Plotting selected item.")
-        selected_items = self.graph_tree.selection()
-        if not selected_items:
-            print("No item selected.")
+        # The points are computed on graph_pool and drawn by poll_graph_request. Each call
+        # supersedes the one before, so arrowing through the list only draws where it stops.
+        graphs_log.debug("Plotting selected items.")
+        selected = [(self.graph_tree.item(row_id, 'text'), self.graph_tree_item_ids[row_id])
+                    for row_id in self.graph_tree.selection() if row_id in self.graph_tree_item_ids]
+        if not selected:
+            graphs_log.debug("No item selected.")
             return
-        item_id = selected_items[0]
-        item_name = self.graph_tree.item(item_id)['text']
-        print("Selected item:", item_name)
-
-        dates = sorted(self.data.keys())
-        values = []
-        labels = []
-        for date in dates:
-            data_dict = self.data[date]
-            item_info = self.find_item_in_data(data_dict, item_name)
-            if item_info:
-                item_type = item_info['type']
-                value = item_info['value']
-                try:
-                    if item_type == "complete/incomplete":
-                        value = 1 if value else 0
-                        print("Converted boolean value to:", value)
-                    else:
-                        value = float(value)
-                    values.append(value)
-                    labels.append(date)
-                    print("Date:", date, "Value:", value)
-                except ValueError:
-                    print("Invalid value on date:", date)
-                    continue
-
-        # Clear previous plot
-        for widget in self.graph_view_pane.winfo_children():
-            widget.destroy()
-            print("Cleared previous plot.")
+        graphs_log.debug("Selected items: %s", selected)
+
+        self.ensure_graph_canvas()
+        entries = [self.core.catalog_entry(node_id) for name, node_id in selected]
+        modes = aggregations_for(entry.item_type for entry in entries if entry is not None)
+        self.aggregation_dropdown.config(values=modes)
+        if self.graph_aggregation.get() not in modes:
+            self.graph_aggregation.set("Daily")
+        mode = self.graph_aggregation.get()
+        max_points = max(50, self.graph_width_pixels() // 3)
+        if self.graph_future is not None:
+            # Only stops it if it hasn't started; a running one notices it is stale and stops early
+            self.graph_future.cancel()
+        self.graph_request_id += 1
+        self.graph_request_started = time.perf_counter()
+        self.graph_future = self.graph_pool.submit(self.compute_graph_points, self.graph_request_id,
+                                                   selected, mode, max_points)
+        placeholder = selected[0][0] if len(selected) == 1 else f"{len(selected)} items"
+        self.graph_placeholder.config(text=f"Loading {placeholder}...")
+        self.graph_placeholder.place(relx=0.5, rely=0.5, anchor='center')
+        self.root.after(20, self.poll_graph_request, self.graph_request_id, selected, mode)
+
+    def compute_graph_points(self, request_id, selected, mode, max_points):
+        # Runs on graph_pool. Returns the points of each selected item, or None once a newer
+        # request has been made.
+        if request_id != self.graph_request_id:
+            return None
+        # Only items that haven't been plotted before are read from the history, in one pass
+        self.core.load_series([node_id for name, node_id in selected])
+        points = []
+        for name, node_id in selected:
+            if request_id != self.graph_request_id:
+                return None
+            points.append(self.core.graph_points(node_id, mode, max_points))
+        return points
+
+    def poll_graph_request(self, request_id, selected, mode):
+        if request_id != self.graph_request_id:
+            # Superseded
+            return
+        future = self.graph_future
+        if not future.done():
+            self.root.after(20, self.poll_graph_request, request_id, selected, mode)
+            return
+        self.graph_future = None
+        self.graph_placeholder.place_forget()
+        try:
+            plotted = future.result()
+        except Exception as error:
+            graphs_log.warning("Computing the graph failed: %s", error)
+            return
+        # Until the result is drawn, graph_request_id can't change (both run on the Tk thread)
+        if len(selected) > 1:
+            self.show_multi_graph([(name, points) for (name, node_id), points in zip(selected, plotted)],
+                                  self.graph_layout.get(), mode)
+            graphs_log.debug("Plotted %s items on graph.", len(plotted))
+        else:
+            self.clear_multi_graph()
+            item_name, node_id = selected[0]
+            points = plotted[0]
+            if points is None:
+                graphs_log.debug("No data to plot.")
+                self.show_graph(np.empty(0, dtype='datetime64[D]'), np.empty(0), 1, f"No data for {item_name}")
+            else:
+                self.show_graph(*points, f"{item_name}: {mode.lower()}", image_key=(node_id, mode))
+                graphs_log.debug("Plotted item on graph.")
+        perf_stats.record('plot_item', (time.perf_counter() - self.graph_request_started) * 1000,
+                          self.core.data_size()['dates'])
+
+    def graph_width_pixels(self):
+        width = self.graph_canvas.get_tk_widget().winfo_width()
+        if width <= 1:
+            # Not laid out yet
+            width = self.graph_figure.get_figwidth() * self.graph_figure.dpi
+        return int(width)
+
+    def ensure_graph_canvas(self):
+        if self.graph_canvas is not None:
+            return
+        self.graph_figure = Figure(figsize=(5 * self.ui_scale, 4 * self.ui_scale), dpi=100)
+        self.graph_ax = self.graph_figure.add_subplot(111)
+        self.graph_ax.set_xlabel("Date")
+        self.graph_ax.set_ylabel("Value")
+        self.graph_ax.xaxis_date()
+        locator = mdates.AutoDateLocator()
+        self.graph_ax.xaxis.set_major_locator(locator)
+        self.graph_ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        # The bars and title change on every selection, so they are animated: full redraws leave
+        # them out and they are drawn on top of the cached background instead
+        self.graph_ax.title.set_animated(True)
+        self.graph_bars = None
+        self.graph_dates = None
+        self.graph_bar_days = None
+        self.graph_background = None
+        self.graph_image_key = None  # (item id, aggregation) of the graph shown, if cacheable
+        self.graph_multi_axes = []  # Axes used while several items are shown
+        self.graph_canvas = TimedFigureCanvas(self.graph_figure, master=self.graph_view_pane)
+        self.graph_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=1)
+        self.graph_canvas.mpl_connect('draw_event', self.on_graph_draw)
+        # Shown over the graph while the points for a new selection are computed
+        self.graph_placeholder = ttk.Label(self.graph_view_pane)
+        graphs_log.debug("Created graph figure and canvas.")
+
+    def show_graph(self, dates, values, bar_days, title, image_key=None):
+        # image_key names what is shown so its rendered background can be cached and reused
+        ax = self.graph_ax
+        ax.title.set_text(title)
+        ylim = self.graph_ylim(values)
+        same_bars = (self.graph_dates is not None and bar_days == self.graph_bar_days
+                     and np.array_equal(dates, self.graph_dates))
+        self.graph_image_key = image_key
+        background = self.graph_image_cache.get(self.graph_image_cache_key())
+        if same_bars:
+            for bar, value in zip(self.graph_bars, values):
+                bar.set_height(value)
+            if background is None and ylim == ax.get_ylim():
+                background = self.graph_background
+        else:
+            if self.graph_bars is not None:
+                self.graph_bars.remove()
+            # Bars start at their bucket's first day and cover most of the bucket
+            self.graph_bars = ax.bar(dates, values, width=bar_days * 0.8, align='edge', animated=True)
+            if len(dates):
+                ax.set_xlim(dates[0] - np.timedelta64(1, 'D'),
+                            dates[-1] + np.timedelta64(int(np.ceil(bar_days)) + 1, 'D'))
+            self.graph_dates = dates
+            self.graph_bar_days = bar_days
+            graphs_log.debug("Replaced bars and x-ticks.")
+        ax.set_ylim(ylim)
+        if background is not None:
+            # Only animated artists differ from a background we already have: restore it and blit them
+            self.graph_background = background
+            with perf_stats.timed('canvas.blit', len(values)):
+                self.graph_canvas.restore_region(background)
+                self.draw_animated_graph_artists()
+            graphs_log.debug("Drew bars over a cached background.")
+            return
+        self.graph_canvas.draw_idle()
 
-        if not values:
-            print("No data to plot.")
+    def graph_image_cache_key(self):
+        # The background also depends on the canvas size, so it is part of the key
+        if self.graph_image_key is None:
+            return None
+        return self.graph_image_key + tuple(self.graph_figure.bbox.size)
+
+    def show_multi_graph(self, plotted, layout, mode):
+        # Several items as lines on one shared date axis, either overlaid or one row each.
+        # These are drawn normally rather than blitted; the single-item axes are hidden meanwhile.
+        self.clear_multi_graph()
+        self.graph_ax.set_visible(False)
+        if layout == "Overlay":
+            axes = [self.graph_figure.add_subplot(111)] * len(plotted)
+            axes[0].set_title(f"{len(plotted)} items: {mode.lower()}")
+        else:
+            axes = list(self.graph_figure.subplots(len(plotted), 1, sharex=True, squeeze=False,
+                                                   gridspec_kw={'hspace': 0.6})[:, 0])
+        for ax in axes:
+            if ax not in self.graph_multi_axes:
+                self.graph_multi_axes.append(ax)
+                locator = mdates.AutoDateLocator()
+                ax.xaxis.set_major_locator(locator)
+                ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        for ax, (name, points) in zip(axes, plotted):
+            if points is None:
+                name = f"{name} (no data)"
+                ax.plot(np.empty(0, dtype='datetime64[D]'), np.empty(0), label=name)
+            else:
+                ax.plot(points[0], points[1], marker='.', label=name)
+            if layout != "Overlay":
+                ax.set_title(name, fontsize='small')
+        if layout == "Overlay":
+            axes[0].legend(fontsize='small')
+        self.graph_canvas.draw_idle()
+
+    def clear_multi_graph(self):
+        if not self.graph_multi_axes:
+            return
+        for ax in self.graph_multi_axes:
+            ax.remove()
+        self.graph_multi_axes = []
+        self.graph_image_key = None
+        self.graph_ax.set_visible(True)
+        # The cached background shows the removed axes, so the next update needs a full draw
+        self.graph_background = None
+
+    def graph_ylim(self, values):
+        low = min(0.0, float(values.min())) if len(values) else 0.0
+        high = max(0.0, float(values.max())) if len(values) else 1.0
+        if high == low:
+            high = low + 1.0
+        margin = (high - low) * 0.05
+        return (low - margin if low < 0 else low, high + margin)
+
+    def on_graph_draw(self, event):
+        # A full redraw leaves out the animated artists; keep it as the background and put them back
+        if self.graph_multi_axes:
             return
+        self.graph_background = self.graph_canvas.copy_from_bbox(self.graph_figure.bbox)
+        if self.graph_image_key is not None:
+            self.graph_image_cache.put(self.graph_image_cache_key(), self.graph_background)
+        self.draw_animated_graph_artists()
 
-        # Plot the data
-        fig = Figure(figsize=(5 * self.ui_scale, 4 * self.ui_scale), dpi=100)
-        ax = fig.add_subplot(111)
-        ax.bar(labels, values)
-        ax.set_title(f"Values of {item_name} over time")
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Value")
-        fig.autofmt_xdate()
-
-        canvas = FigureCanvasTkAgg(fig, master=self.graph_view_pane)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=1)
-        print("Plotted item on graph.")
-
-    def find_item_in_data(self, data_dict, item_name):
-        if 'folders' in data_dict:
-            for folder_data in data_dict['folders'].values():
-                result = self.find_item_in_data(folder_data, item_name)
-                if result:
-                    return result
-        if 'items' in data_dict:
-            if item_name in data_dict['items']:
-                return data_dict['items'][item_name]
-        for key, value in data_dict.items():
-            if isinstance(value, dict) and 'type' in value and key == item_name:
-                return value
-        return None
+    def draw_animated_graph_artists(self):
+        self.graph_figure.draw_artist(self.graph_ax.title)
+        for bar in self.graph_bars or []:
+            self.graph_figure.draw_artist(bar)
+        self.graph_canvas.blit(self.graph_figure.bbox)
 
     def run(self):
         self.root.mainloop()
-        print("Application closed.")
+        if self.history_thread is not None:
+            self.history_stop.set()
+            self.history_thread.join()
+        self.graph_request_id += 1  # Makes a running computation stop early
+        self.graph_pool.shutdown(cancel_futures=True)
+        # Write anything still waiting for the quiet period before exiting
+        self.core.close()
+        log.debug("Application closed.")
+
+
+BENCHMARK_ITEM_TYPES = ("int", "float", "complete/incomplete", "string")
+
+
+def generate_history(days, folders, items, depth, end_date="2024-12-31", seed=0):
+    # Synthetic tracking data for days dates ending at end_date. Every day has the same layout,
+    # like a real history: items items at the root and in every folder, and folders folders
+    # at the root and in every folder down to depth levels. Values are random but reproducible.
+    rng = random.Random(seed)
+
+    def make_node(level):
+        node = {'folders': [], 'items': []}
+        for index in range(items):
+            item_type = BENCHMARK_ITEM_TYPES[index % len(BENCHMARK_ITEM_TYPES)]
+            node['items'].append({'name': f"Item {level}.{index}", 'type': item_type, 'value': None})
+        if level < depth:
+            for index in range(folders):
+                folder = make_node(level + 1)
+                folder['name'] = f"Folder {level}.{index}"
+                node['folders'].append(folder)
+        return node
+
+    def fill_values(node):
+        for folder in node['folders']:
+            fill_values(folder)
+        for item in node['items']:
+            if item['type'] == "int":
+                item['value'] = rng.randint(0, 100)
+            elif item['type'] == "float":
+                item['value'] = round(rng.uniform(0, 10), 2)
+            elif item['type'] == "complete/incomplete":
+                item['value'] = rng.random() < 0.5
+            else:
+                item['value'] = rng.choice(["", "note"])
+
+    layout = make_node(0)
+    last_day = datetime.strptime(end_date, "%Y-%m-%d")
+    data = {}
+    for offset in range(days - 1, -1, -1):
+        day_data = copy.deepcopy(layout)
+        fill_values(day_data)
+        data[(last_day - timedelta(days=offset)).strftime("%Y-%m-%d")] = day_data
+    return data
+
+
+def benchmark_storage(path, stats):
+    # One run over a copy of a generated data file: the TrackerCore calls behind the app's hot
+    # paths, without the widgets around them. Nothing is saved until the core is closed.
+    with stats.timed('load_data'):
+        core = TrackerCore(path, save_delay=3600)
+    size = len(core.data)
+    with stats.timed('load history', size):
+        for date, day_data in core.read_days(core.missing_dates()):
+            core.add_loaded(date, day_data)
+    last_date = max(core.data)
+    item_paths = [node_path for node_path, node in core.day_index(last_date).nodes.items() if 'type' in node]
+
+    with stats.timed('populate_graph_tree (catalog)', size):
+        core.build_catalog()
+        graph_ids = [node_id for name, node_id in iter_catalog_items(core.catalog_tree())]
+    if graph_ids:
+        with stats.timed('plot_item (one series)', size):
+            for mode in aggregations_for([core.catalog_entry(graph_ids[0]).item_type]):
+                core.graph_points(graph_ids[0], mode, max_points=1000)
+    with stats.timed('plot_item (all series)', size):
+        core.load_series(graph_ids)
+
+    new_date = (datetime.strptime(last_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    with stats.timed('copy_previous_items_only', size):
+        core.copy_day(new_date, last_date, False)
+    for index, item_path in enumerate(item_paths):
+        with stats.timed('set_item_value', size):
+            core.set_value(new_date, item_path, index)
+
+    # Drag the deepest item to the top of the root and back again
+    moved_path = max(item_paths, key=lambda node_path: node_path.count('/'))
+    parent_path, _, name = moved_path.rpartition('/')
+    old_index = core.get(new_date, parent_path)['items'].index(core.get(new_date, moved_path))
+    for old_path, new_parent, index in ((moved_path, '', 0), (name, parent_path, old_index)):
+        with stats.timed('update_data_order', size):
+            core.move(new_date, old_path, new_parent, index)
+
+    # Closing writes every queued change in one batch, as SaveWorker does after the quiet period
+    with stats.timed('save_data', size):
+        core.close()
+
+
+def iter_catalog_items(tree):
+    # (name, node id) of every item in an ItemCatalog.tree()
+    for folder in tree['folders'].values():
+        yield from iter_catalog_items(folder)
+    yield from tree['items']
+
+
+def iter_catalog_folders(tree, parent_path=''):
+    # Path of every folder in an ItemCatalog.tree()
+    for folder_name, folder in tree['folders'].items():
+        folder_path = join_path(parent_path, folder_name)
+        yield folder_path
+        yield from iter_catalog_folders(folder, folder_path)
+
+
+def run_history_benchmark(days, folders, items, depth, repeat=3, output="benchmark_results.json"):
+    # Generates a history of the given size, times it with each storage backend and writes
+    # the PerfStats of every backend to output as JSON, so runs can be compared over time
+    report = {
+        'parameters': {'days': days, 'folders': folders, 'items': items, 'depth': depth, 'repeat': repeat},
+        'bucket_limits_ms': list(PerfStats.BUCKET_LIMITS_MS),
+        'backends': {},
+    }
+    base_dir = tempfile.mkdtemp(prefix='track_and_graph_benchmark_')
+    try:
+        json_path = os.path.join(base_dir, 'tracking_data.json')
+        with open(json_path, 'w') as f:
+            json.dump(generate_history(days, folders, items, depth), f)
+        report['parameters']['legacy_file_size'] = os.path.getsize(json_path)
+        backend_stats = {'json': PerfStats(), 'sqlite': PerfStats(), 'binary': PerfStats()}
+        with backend_stats['json'].timed('convert legacy file', days):
+            storage = open_storage(json_path)
+            storage.load()
+            storage.close()
+        migrate_json_to_sqlite(json_path, os.path.join(base_dir, 'tracking_data.db'))
+        convert_storage(json_path, os.path.join(base_dir, 'tracking_data.tgb'))
+        for backend, file_name in (('json', 'tracking_data.json'), ('sqlite', 'tracking_data.db'),
+                                   ('binary', 'tracking_data.tgb')):
+            stats = backend_stats[backend]
+            for run in range(repeat):
+                # A fresh copy each time so every run starts from the same history
+                run_dir = os.path.join(base_dir, f"{backend}-{run}")
+                os.mkdir(run_dir)
+                for name in os.listdir(base_dir):
+                    if name.startswith(file_name):
+                        shutil.copy(os.path.join(base_dir, name), run_dir)
+                benchmark_storage(os.path.join(run_dir, file_name), stats)
+            report['backends'][backend] = {
+                'file_size': os.path.getsize(os.path.join(base_dir, file_name)),
+                'operations': stats.snapshot(),
+            }
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for backend, results in report['backends'].items():
+        print(f"{backend} ({results['file_size']} bytes):")
+        for name, operation in results['operations'].items():
+            print("  %-32s %8.2f ms mean %8.2f ms max  (%s calls)"
+                  % (name, operation['total_ms'] / operation['count'], operation['max_ms'], operation['count']))
+    print("Results written to", output)
+    return report
 
 
 if __name__ == "__main__":
-    print("Starting the application.")
-    root = tk.Tk()
-    app = DailyTrackingApp(root)
-    app.run()
-
-
-    
-
-
-    
-
+    parser = argparse.ArgumentParser(description="Daily tracking app")
+    parser.add_argument('--data-file', default="tracking_data.json",
+                        help="tracking data file; .db/.sqlite/.sqlite3 selects the SQLite backend and "
+                             ".tgb the binary snapshot")
+    parser.add_argument('--migrate-to-sqlite', metavar='SQLITE_FILE',
+                        help="copy the JSON data file into a new SQLite file and exit")
+    parser.add_argument('--convert-to', metavar='FILE',
+                        help="copy the data file into a new file in the format its extension selects "
+                             "(.json, .tgb for the binary snapshot, .db) and exit")
+    parser.add_argument('--benchmark-startup', action='store_true',
+                        help="print the time until the window is shown, then exit")
+    parser.add_argument('--benchmark-history', metavar='DAYSxFOLDERSxITEMSxDEPTH',
+                        help="time the data paths on a generated history of this size without "
+                             "opening a window, e.g. 365x4x5x2, then exit")
+    parser.add_argument('--benchmark-repeat', type=int, default=3,
+                        help="runs per backend for --benchmark-history")
+    parser.add_argument('--benchmark-output', default="benchmark_results.json",
+                        help="JSON file --benchmark-history writes its results to")
+    parser.add_argument('--debug', nargs='?', const='all', default='', metavar='SUBSYSTEMS',
+                        help="log debug traces for all subsystems, or a comma separated list of: "
+                             + ", ".join(LOG_SUBSYSTEMS))
+    args = parser.parse_args()
+    configure_logging([name for name in args.debug.split(',') if name])
+
+    if args.migrate_to_sqlite:
+        migrate_json_to_sqlite(args.data_file, args.migrate_to_sqlite, print_progress)
+    elif args.convert_to:
+        if os.path.exists(args.convert_to):
+            parser.error("%s already exists" % args.convert_to)
+        convert_storage(args.data_file, args.convert_to, print_progress)
+    elif args.benchmark_history:
+        try:
+            days, folders, items, depth = (int(part) for part in args.benchmark_history.lower().split('x'))
+        except ValueError:
+            parser.error("--benchmark-history expects DAYSxFOLDERSxITEMSxDEPTH, e.g. 365x4x5x2")
+        run_history_benchmark(days, folders, items, depth, args.benchmark_repeat, args.benchmark_output)
+    else:
+        log.debug("Starting the application.")
+        root = tk.Tk()
+        app = DailyTrackingApp(root, args.data_file)
+        if args.benchmark_startup:
+            root.update()
+            print("Time to first window: %.1f ms" % ((time.perf_counter() - STARTUP_STARTED) * 1000))
+            # What startup used to pay for before the Graphs tab was deferred
+            import_started = time.perf_counter()
+            import_matplotlib()
+            print("Deferred matplotlib import: %.1f ms" % ((time.perf_counter() - import_started) * 1000))
+            root.destroy()
+        app.run()